@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import websockets
+
+from catalog import DEFAULT_CATALOG_FILE
+from codec import JSON, expand, get_codec
+from metrics import peak_rss_mb
+from server import MarketServer
+
+
+def percentiles(samples):
+    """Summary of latency samples in milliseconds"""
+    if len(samples) == 0:
+        return {"count": 0}
+    values = np.array(samples) * 1000
+    p50, p90, p99, p999 = np.percentile(values, [50, 90, 99, 99.9])
+    return {"count": len(values), "mean": float(values.mean()), "p50": p50, "p90": p90,
+            "p99": p99, "p99.9": p999, "max": float(values.max())}
+
+
+def current_rss_mb():
+    """Resident set size of this process (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return None
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+class MarketBenchmark:
+    """Drives an in-process MarketServer with subscriber, trader and query clients"""
+
+    def __init__(self, port=8790, subscribers=10, traders=4, orders_per_second=50, queriers=1,
+                 queries_per_second=2, duration=10, update_interval=1.0, wire_format=JSON):
+        self.port = port
+        self.uri = f"ws://localhost:{port}"
+        self.subscribers = subscribers
+        self.traders = traders
+        self.orders_per_second = orders_per_second
+        self.queriers = queriers
+        self.queries_per_second = queries_per_second
+        self.duration = duration
+        self.update_interval = update_interval
+        self.wire_format = wire_format  # Format negotiated by the subscribers
+
+        self.ack_latencies = []
+        self.query_latencies = []
+        self.fanout_latencies = []
+        self.tick_times = []
+        self.updates_received = 0
+        self.orders_sent = 0
+        self.errors = 0
+
+    def instrument(self, server):
+        """Record the wall time of every market tick"""
+        update_market = server.update_market
+
+        async def timed_update_market(slots=None):
+            await update_market(slots)
+            self.tick_times.append(time.monotonic())
+
+        server.update_market = timed_update_market
+
+    async def subscriber(self, stop):
+        codec = get_codec(self.wire_format)
+        uri = f"{self.uri}/?format={self.wire_format}"
+        async with websockets.connect(uri, max_size=None, ping_interval=None) as websocket:
+            while not stop.is_set():
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), 0.5)
+                except asyncio.TimeoutError:
+                    continue
+                data = expand(codec.decode(message))
+                if data.get("type") == "market_update":
+                    # Updates are stamped when encoded; the server runs in this process
+                    sent_at = data["timestamp"]
+                    if isinstance(sent_at, str):
+                        sent_at = datetime.fromisoformat(sent_at).timestamp()
+                    self.fanout_latencies.append(time.time() - sent_at)
+                    self.updates_received += 1
+
+    async def trader(self, stop, seed):
+        rng = random.Random(seed)
+        async with websockets.connect(self.uri, max_size=None, ping_interval=None) as websocket:
+            await websocket.recv()  # Initial market_state
+            asset_ids = list(self.server.engine)
+            pending = []
+
+            async def read_acks():
+                async for message in websocket:
+                    data = json.loads(message)
+                    if "status" in data:
+                        # Orders on one connection are acknowledged in order
+                        self.ack_latencies.append(time.monotonic() - pending.pop(0))
+                        if data["status"] != "success":
+                            self.errors += 1
+
+            reader = asyncio.create_task(read_acks())
+            interval = 1 / self.orders_per_second
+            next_send = time.monotonic()
+            while not stop.is_set():
+                pending.append(time.monotonic())
+                await websocket.send(json.dumps({
+                    "action": rng.choice(("buy", "sell")),
+                    "asset_id": rng.choice(asset_ids),
+                    "amount": rng.uniform(1, 1000)
+                }))
+                self.orders_sent += 1
+                next_send += interval
+                await asyncio.sleep(max(next_send - time.monotonic(), 0))
+
+            # Give outstanding orders a moment to be acknowledged
+            for _ in range(20):
+                if not pending:
+                    break
+                await asyncio.sleep(0.05)
+            reader.cancel()
+
+    async def querier(self, stop):
+        async with websockets.connect(self.uri, max_size=None, ping_interval=None) as websocket:
+            await websocket.recv()  # Initial market_state
+            answered = asyncio.Event()
+
+            async def read_responses():
+                # Keep draining broadcasts so the connection never stalls
+                async for message in websocket:
+                    if "status" in json.loads(message):
+                        answered.set()
+
+            reader = asyncio.create_task(read_responses())
+            while not stop.is_set():
+                started = time.monotonic()
+                answered.clear()
+                await websocket.send(json.dumps({"action": "get_assets"}))
+                await answered.wait()
+                self.query_latencies.append(time.monotonic() - started)
+                await asyncio.sleep(1 / self.queries_per_second)
+            reader.cancel()
+
+    async def run(self, workdir):
+        self.server = MarketServer(
+            port=self.port,
+            trends_file=os.path.join(workdir, "meme_trends.json"),
+            journal_file=os.path.join(workdir, "transactions.db"),
+            recorder_dir=os.path.join(workdir, "market_changes"),
+            snapshot_file=os.path.join(workdir, "market_snapshot.npz"),
+            catalog_file=DEFAULT_CATALOG_FILE
+        )
+        self.server.update_interval = self.update_interval
+        self.instrument(self.server)
+        server_task = asyncio.create_task(self.server.run())
+        await asyncio.sleep(0.5)
+
+        stop = asyncio.Event()
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        wall_before = time.monotonic()
+        clients = [asyncio.create_task(self.subscriber(stop)) for _ in range(self.subscribers)]
+        clients += [asyncio.create_task(self.trader(stop, seed)) for seed in range(self.traders)]
+        clients += [asyncio.create_task(self.querier(stop)) for _ in range(self.queriers)]
+
+        await asyncio.sleep(self.duration)
+        stop.set()
+        await asyncio.gather(*clients, return_exceptions=True)
+        wall = time.monotonic() - wall_before
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+        server_task.cancel()
+        await asyncio.gather(server_task, return_exceptions=True)
+        return self.report(wall, usage_before, usage_after)
+
+    def report(self, wall, usage_before, usage_after):
+        cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+        intervals = np.diff(self.tick_times)
+        jitter = np.abs(intervals - self.update_interval) if len(intervals) else []
+        return {
+            "version": git_revision(),
+            "timestamp": datetime.now().isoformat(),
+            "config": {
+                "subscribers": self.subscribers,
+                "traders": self.traders,
+                "orders_per_second_per_trader": self.orders_per_second,
+                "queriers": self.queriers,
+                "duration": self.duration,
+                "update_interval": self.update_interval,
+                "format": self.wire_format,
+                "assets": len(self.server.engine)
+            },
+            "orders_sent": self.orders_sent,
+            "orders_acked": len(self.ack_latencies),
+            "order_errors": self.errors,
+            "orders_per_second": len(self.ack_latencies) / wall,
+            "order_ack_latency_ms": percentiles(self.ack_latencies),
+            "get_assets_latency_ms": percentiles(self.query_latencies),
+            "updates_received": self.updates_received,
+            "fanout_latency_ms": percentiles(self.fanout_latencies),
+            "ticks": len(self.tick_times),
+            "tick_jitter_ms": percentiles(jitter),
+            # Clients run in the same process, so CPU covers server and load generator
+            "cpu_seconds": cpu,
+            "cpu_utilization": cpu / wall,
+            "rss_mb": current_rss_mb(),
+            "peak_rss_mb": peak_rss_mb()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and latency benchmark for MarketServer")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--subscribers", type=int, default=10, help="Clients that only receive market updates")
+    parser.add_argument("--traders", type=int, default=4, help="Clients sending buy/sell orders")
+    parser.add_argument("--orders-per-second", type=float, default=50, help="Order rate of each trader")
+    parser.add_argument("--queriers", type=int, default=1, help="Clients polling get_assets")
+    parser.add_argument("--queries-per-second", type=float, default=2, help="get_assets rate of each querier")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load")
+    parser.add_argument("--update-interval", type=float, default=1.0, help="Market tick interval")
+    parser.add_argument("--format", default=JSON, help="Wire format of the subscribers (json or msgpack)")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    benchmark = MarketBenchmark(
+        port=args.port, subscribers=args.subscribers, traders=args.traders,
+        orders_per_second=args.orders_per_second, queriers=args.queriers,
+        queries_per_second=args.queries_per_second, duration=args.duration,
+        update_interval=args.update_interval, wire_format=args.format
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        results = asyncio.run(benchmark.run(workdir))
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import numpy as np
+
+from history import iso_timestamp
+from snapshot import RingUpdate
+
+# Supported candle resolutions in seconds
+RESOLUTIONS = {"1s": 1, "1m": 60, "5m": 300, "1h": 3600}
+
+# Fields of a closed bar as stored in the ring
+BAR_FIELDS = ("start", "open", "high", "low", "close", "volume")
+
+
+class CandleSeries:
+    """Incremental OHLCV bars of one resolution for every asset slot
+
+    The open bar of each row lives in flat arrays and is updated in place;
+    when a point falls into a later bucket the open bar is pushed into a
+    fixed-capacity ring of closed bars. Closed bars never change, so a
+    snapshot only carries the ones closed since the previous snapshot.
+    """
+
+    def __init__(self, seconds, capacity=200, rows=64):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.current = np.full((rows, len(BAR_FIELDS)), np.nan)
+        self.bars = np.zeros((rows, capacity, len(BAR_FIELDS)))
+        self.counts = np.zeros(rows, dtype=np.int64)
+        self.saved = np.zeros(rows, dtype=np.int64)  # Closed bars of each row already in a snapshot
+
+    @property
+    def rows(self):
+        return len(self.counts)
+
+    def ensure_rows(self, rows):
+        """Grow the buffers to hold at least the given number of rows"""
+        if rows <= self.rows:
+            return
+        new_rows = max(rows, 2 * self.rows)
+        current = np.full((new_rows, len(BAR_FIELDS)), np.nan)
+        current[:self.rows] = self.current
+        bars = np.zeros((new_rows, self.capacity, len(BAR_FIELDS)))
+        bars[:self.rows] = self.bars
+        counts = np.zeros(new_rows, dtype=np.int64)
+        counts[:self.rows] = self.counts
+        saved = np.zeros(new_rows, dtype=np.int64)
+        saved[:self.rows] = self.saved
+        self.current, self.bars, self.counts, self.saved = current, bars, counts, saved
+
+    def reset(self, row):
+        """Forget every bar of a row so its slot can be reused"""
+        self.current[row] = np.nan
+        self.counts[row] = 0
+        self.saved[row] = 0
+
+    def state(self, rows):
+        """Open bars and counts of the first rows plus the bars closed since the last call, for snapshots"""
+        counts = self.counts[:rows].copy()
+        first = np.maximum(self.saved[:rows], counts - self.capacity)
+        new = np.maximum(counts - first, 0)
+        row_index = np.repeat(np.arange(rows), new)
+        # Write count of every new bar: first[row], first[row] + 1, ... for each row in turn
+        offsets = np.arange(len(row_index)) - np.repeat(np.cumsum(new) - new, new)
+        bar_counts = np.repeat(first, new) + offsets
+        bars = self.bars[row_index, bar_counts % self.capacity]
+        self.saved[:rows] = counts
+        return {
+            "current": self.current[:rows].copy(),
+            "bars": RingUpdate(rows, self.capacity, row_index, bar_counts, bars),
+            "counts": counts
+        }
+
+    def load_state(self, state):
+        """Replace the bars with a snapshot taken by state(); returns False if the capacity differs
+
+        state["bars"] is the snapshot's ring file. Bars it lost, or
+        overwrote after the snapshot was taken, are left out of queries.
+        """
+        ring = state["bars"]
+        if ring.shape[1:] != (self.capacity, len(BAR_FIELDS) + 1):
+            return False
+        counts = state["counts"]
+        rows = len(counts)
+        self.ensure_rows(rows)
+        self.current[:rows] = state["current"]
+        self.counts[:rows] = counts
+        self.saved[:rows] = counts
+
+        # The write count each ring position should hold: the newest below the row's count
+        latest = counts[:, np.newaxis] - 1
+        expected = latest - (latest - np.arange(self.capacity)) % self.capacity
+        stored = min(rows, len(ring))
+        valid = np.zeros((rows, self.capacity), dtype=bool)
+        for start in range(0, stored, 1024):
+            # Copy from the mapped file in blocks to keep restores from holding it twice
+            end = min(start + 1024, stored)
+            block = ring[start:end]
+            self.bars[start:end] = block[..., :-1]
+            valid[start:end] = (expected[start:end] >= 0) & (block[..., -1] == expected[start:end])
+        self.bars[:rows][~valid] = np.nan
+        return True
+
+    def update_rows(self, rows, timestamp, prices, volumes):
+        """Fold one point per row into the open bars, closing bars that ended"""
+        rows = np.asarray(rows, dtype=np.intp)
+        prices = np.broadcast_to(np.asarray(prices, dtype=np.float64), rows.shape)
+        volumes = np.broadcast_to(np.asarray(volumes, dtype=np.float64), rows.shape)
+        bucket = np.floor(timestamp / self.seconds) * self.seconds
+
+        # Rows whose open bar belongs to an earlier bucket (or have none yet)
+        rolled = self.current[rows, 0] != bucket
+        if rolled.any():
+            rolled_rows = rows[rolled]
+            closing = rolled_rows[~np.isnan(self.current[rolled_rows, 0])]
+            if len(closing):
+                positions = self.counts[closing] % self.capacity
+                self.bars[closing, positions] = self.current[closing]
+                self.counts[closing] += 1
+            opening = prices[rolled]
+            self.current[rolled_rows] = np.column_stack((
+                np.full(len(rolled_rows), bucket), opening, opening, opening, opening, np.zeros(len(rolled_rows))
+            ))
+
+        bars = self.current[rows]
+        np.maximum(bars[:, 2], prices, out=bars[:, 2])
+        np.minimum(bars[:, 3], prices, out=bars[:, 3])
+        bars[:, 4] = prices
+        bars[:, 5] += volumes
+        self.current[rows] = bars
+
+    def query(self, row, start=None, end=None, limit=None):
+        """Closed bars plus the open bar of a row, oldest first, filtered by start time"""
+        count = int(self.counts[row])
+        first = max(count - self.capacity, 0)
+        positions = np.arange(first, count) % self.capacity
+        bars = self.bars[row, positions]
+        # Bars missing from a restored snapshot are NaN
+        bars = bars[~np.isnan(bars[:, 0])]
+        if not np.isnan(self.current[row, 0]):
+            bars = np.vstack((bars, self.current[row][np.newaxis]))
+
+        if start is not None:
+            bars = bars[bars[:, 0] >= start]
+        if end is not None:
+            bars = bars[bars[:, 0] <= end]
+        if limit is not None:
+            bars = bars[-limit:] if limit > 0 else bars[:0]
+        return bars
+
+
+class CandleBook:
+    """Candle series for every supported resolution"""
+
+    def __init__(self, resolutions=None, capacity=200, rows=64):
+        resolutions = resolutions or list(RESOLUTIONS)
+        self.series = {name: CandleSeries(RESOLUTIONS[name], capacity, rows) for name in resolutions}
+
+    def ensure_rows(self, rows):
+        for series in self.series.values():
+            series.ensure_rows(rows)
+
+    def reset(self, row):
+        for series in self.series.values():
+            series.reset(row)
+
+    def state(self, rows):
+        """Copy of the first rows of every resolution, for snapshots"""
+        state = {}
+        for name, series in self.series.items():
+            for field, values in series.state(rows).items():
+                state[f"{name}.{field}"] = values
+        return state
+
+    def load_state(self, state):
+        """Restore every resolution from a snapshot taken by state()
+
+        Resolutions missing from the snapshot, or saved with another
+        capacity, start empty.
+        """
+        for name, series in self.series.items():
+            fields = {field: state.get(f"{name}.{field}") for field in ("current", "bars", "counts")}
+            if any(values is None for values in fields.values()) or not series.load_state(fields):
+                series.current[:] = np.nan
+                series.counts[:] = 0
+                series.saved[:] = 0
+
+    def update_rows(self, rows, timestamp, prices, volumes):
+        """Update every resolution with one point per row"""
+        for series in self.series.values():
+            series.update_rows(rows, timestamp, prices, volumes)
+
+    def open_bars(self, row):
+        """The open bar of a row at every resolution, keyed by resolution name"""
+        bars = {}
+        for name, series in self.series.items():
+            if not np.isnan(series.current[row, 0]):
+                bar = series.current[row].tolist()
+                bars[name] = dict(zip(BAR_FIELDS, bar), timestamp=iso_timestamp(bar[0]))
+        return bars
+
+    def query(self, row, resolution, start=None, end=None, limit=None):
+        """Bars of one row and resolution as the list of dicts clients expect"""
+        if resolution not in self.series:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        bars = self.series[resolution].query(row, start, end, limit)
+        return [
+            dict(zip(BAR_FIELDS, bar), timestamp=iso_timestamp(bar[0]))
+            for bar in bars.tolist()
+        ]
@@ -0,0 +1,122 @@
+import json
+import os
+
+from engine import VOLATILITY_BANDS, DEFAULT_VOLATILITY_BAND
+
+# Asset catalog shipped with the market, used unless another file is given
+DEFAULT_CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets.json")
+
+# Class parameters copied into an asset's definition unless the asset sets them
+CLASS_DEFAULT_FIELDS = ("supply", "modifiers")
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class AssetCatalog:
+    """Asset classes and instruments loaded from a JSON catalog file
+
+    The file holds two maps:
+
+        {"classes": {"stock": {"volatility": [0.99, 1.01], ...}, ...},
+         "assets": {"AAPL": {"type": "stock", "name": ..., "price": ..., ...}, ...}}
+
+    A class sets the volatility band and tick interval of its assets and
+    may give default supply and modifiers. Assets are indexed by id and by type.
+    Every class and asset is checked when the catalog is built, so a bad
+    entry is reported before any of the catalog is applied to a market.
+    """
+
+    def __init__(self, classes=None, assets=None):
+        self.classes = classes or {}
+        self.assets = {}
+        self.by_type = {}
+        self._bands = {}     # asset type -> (low, high)
+        self._resolved = {}  # asset id -> definition with class defaults
+        for asset_type, asset_class in self.classes.items():
+            self._bands[asset_type] = self._check_class(asset_type, asset_class)
+        for asset_id, asset_data in (assets or {}).items():
+            if "type" not in asset_data or "price" not in asset_data:
+                raise ValueError(f"Catalog asset {asset_id} needs a type and a price")
+            self.assets[asset_id] = asset_data
+            self.by_type.setdefault(asset_data["type"], set()).add(asset_id)
+            self._resolved[asset_id] = self._resolve(asset_id, asset_data)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data.get("classes"), data.get("assets"))
+
+    def __len__(self):
+        return len(self.assets)
+
+    def __contains__(self, asset_id):
+        return asset_id in self.assets
+
+    def __iter__(self):
+        return iter(self.assets)
+
+    def band(self, asset_type):
+        """(low, high) per-tick price multiplier range of an asset class"""
+        band = self._bands.get(asset_type)
+        if band is None:
+            return VOLATILITY_BANDS.get(asset_type, DEFAULT_VOLATILITY_BAND)
+        return band
+
+    def tick_interval(self, asset_type, default=1.0):
+        """Seconds between price ticks of an asset class"""
+        return self.classes.get(asset_type, {}).get("tick_interval", default)
+
+    def asset_data(self, asset_id):
+        """An asset's definition with its class defaults filled in"""
+        return dict(self._resolved[asset_id])
+
+    def _check_class(self, asset_type, asset_class):
+        """Validate a class's parameters; returns its volatility band or None for the default"""
+        tick_interval = asset_class.get("tick_interval", 1.0)
+        if not is_number(tick_interval) or tick_interval <= 0:
+            raise ValueError(f"Catalog class {asset_type} needs a positive tick_interval, not {tick_interval!r}")
+        volatility = asset_class.get("volatility")
+        if volatility is None:
+            return None
+        if (not isinstance(volatility, (list, tuple)) or len(volatility) != 2
+                or not all(is_number(bound) for bound in volatility) or not 0 < volatility[0] <= volatility[1]):
+            raise ValueError(f"Catalog class {asset_type} needs a volatility of [low, high], not {volatility!r}")
+        return tuple(volatility)
+
+    def _resolve(self, asset_id, asset):
+        asset_data = dict(asset)
+        asset_class = self.classes.get(asset_data["type"], {})
+        for field in CLASS_DEFAULT_FIELDS:
+            if field not in asset_data and field in asset_class:
+                asset_data[field] = asset_class[field]
+        if "supply" not in asset_data:
+            raise ValueError(f"Catalog asset {asset_id} has no supply and its class gives none")
+        for field in ("price", "supply"):
+            if not is_number(asset_data[field]) or asset_data[field] <= 0:
+                raise ValueError(f"Catalog asset {asset_id} needs a positive {field}, not {asset_data[field]!r}")
+        return asset_data
+
+    def diff(self, previous):
+        """Asset ids added, removed and changed relative to a previous catalog
+
+        An asset counts as changed if its own definition or its class
+        parameters differ. With no previous catalog every asset is added.
+        """
+        if previous is None:
+            return list(self.assets), [], []
+        added = [asset_id for asset_id in self.assets if asset_id not in previous.assets]
+        removed = [asset_id for asset_id in previous.assets if asset_id not in self.assets]
+        changed_classes = {
+            asset_type for asset_type in set(self.classes) | set(previous.classes)
+            if self.classes.get(asset_type) != previous.classes.get(asset_type)
+        }
+        changed = [
+            asset_id for asset_id, asset_data in self.assets.items()
+            if asset_id in previous.assets and (
+                asset_data != previous.assets[asset_id] or asset_data["type"] in changed_classes
+            )
+        ]
+        return added, removed, changed
@@ -0,0 +1,383 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import time
+import zlib
+
+import websockets
+
+from codec import epoch_timestamp
+from fanout import TRADES, CANDLES, TRENDS
+from journal import MAX_PAGE_SIZE
+from server import MarketServer
+
+logger = logging.getLogger(__name__)
+
+# Actions forwarded to the shard that owns the request's asset_id
+ROUTED_ACTIONS = ("buy", "sell", "get_candles", "get_transactions")
+
+
+def shard_for_asset(asset_id, shard_count):
+    """Shard that owns an asset; stable across processes and restarts"""
+    return zlib.crc32(asset_id.encode()) % shard_count
+
+
+def tag_shard(link, response):
+    """Mark each transaction of a shard's response with the shard; ids are only unique within a shard"""
+    if response.get("status") == "success":
+        response["data"] = [dict(record, shard=link.shard_id) for record in response["data"]]
+    return response
+
+
+class ShardOwnership:
+    """Picklable asset filter for one shard of the cluster"""
+
+    def __init__(self, shard_id, shard_count):
+        self.shard_id = shard_id
+        self.shard_count = shard_count
+
+    def __call__(self, asset_id):
+        return shard_for_asset(asset_id, self.shard_count) == self.shard_id
+
+
+class ShardLink:
+    """The gateway's websocket connection to one shard server"""
+
+    def __init__(self, shard_id, uri):
+        self.shard_id = shard_id
+        self.uri = uri
+        self.websocket = None
+        self.sequence = None  # Last market_update seq applied from this shard
+        self.resyncing = False
+        self.assets = set()
+        self.ready = asyncio.Event()
+
+
+class MarketGateway(MarketServer):
+    """Client-facing front end for a market partitioned across shard processes
+
+    Every shard is a MarketServer owning the prices, order matching,
+    journal and recorder of its assets. The gateway keeps a replica of
+    every shard's assets, fed by the shards' market updates, and serves
+    clients from it with the usual subscriptions, wire formats and
+    snapshots. Shard updates are merged and re-sequenced into one client
+    stream every merge_interval seconds. Orders and per-asset queries are
+    forwarded to the owning shard and answered through the gateway;
+    transaction queries without an asset are merged from every shard.
+    Transaction ids are only unique within a shard, so the gateway marks
+    every transaction it returns with its shard.
+    """
+
+    def __init__(self, shard_uris, port=8765, merge_interval=0.02, **kwargs):
+        super().__init__(port=port, **kwargs)
+        self.links = [ShardLink(shard_id, uri) for shard_id, uri in enumerate(shard_uris)]
+        self.merge_interval = merge_interval
+        self.request_ids = itertools.count(1)
+        self.pending = {}          # forwarded request id -> (shard id, callback)
+        self.dirty = False         # Shard updates applied since the last broadcast
+        self.buffered_topics = {}  # channel -> merged per-asset data sent after the next broadcast
+
+    def owner(self, asset_id):
+        return self.links[shard_for_asset(asset_id, len(self.links))]
+
+    async def forward(self, link, message, callback):
+        """Send a request to a shard; callback receives the shard's response"""
+        request_id = next(self.request_ids)
+        self.pending[request_id] = (link.shard_id, callback)
+        try:
+            await link.websocket.send(json.dumps(dict(message, id=request_id)))
+        except Exception as e:
+            self.pending.pop(request_id, None)
+            callback({"status": "error", "message": f"Shard unavailable: {e}"})
+
+    async def request(self, link, message):
+        """Send a request to a shard and wait for its response"""
+        future = asyncio.get_running_loop().create_future()
+        await self.forward(link, message, lambda response: future.done() or future.set_result(response))
+        return await future
+
+    async def dispatch_message(self, websocket, data):
+        """Forward shard-owned actions; everything else is served from the replica"""
+        action = data.get("action")
+        if action == "get_transactions" and not data.get("asset_id"):
+            # Transactions of every asset are spread over the shards' journals
+            self.respond(websocket, data, await self.merged_transactions(data))
+
+        elif action in ROUTED_ACTIONS:
+            if not data.get("asset_id"):
+                self.respond(websocket, data, {"status": "error", "message": "asset_id is required in cluster mode"})
+            elif data["asset_id"] not in self.engine:
+                self.respond(websocket, data, {"status": "error", "message": "Asset not found"})
+            else:
+                link = self.owner(data["asset_id"])
+                message = {key: value for key, value in data.items() if key != "id"}
+                if action == "get_transactions":
+                    callback = lambda response: self.relay(websocket, data, tag_shard(link, response))
+                else:
+                    callback = lambda response: self.relay(websocket, data, response)
+                await self.forward(link, message, callback)
+
+        elif action == "push_meme_trends":
+            # Every shard checks the token (shared through MARKET_PUSH_TOKEN) and applies its coins
+            responses = await asyncio.gather(*(self.request(link, data) for link in self.links))
+            failed = [response for response in responses if response.get("status") != "success"]
+            self.respond(websocket, data, failed[0] if failed else {"status": "success"})
+
+        elif action == "export_excel":
+            responses = await asyncio.gather(*(self.request(link, data) for link in self.links))
+            failed = [response for response in responses if response.get("status") != "success"]
+            if failed:
+                self.respond(websocket, data, failed[0])
+            else:
+                self.respond(websocket, data, {"status": "success", "data": {
+                    "files": [response["data"]["file"] for response in responses],
+                    "rows": sum(response["data"]["rows"] for response in responses)
+                }})
+
+        else:
+            await super().dispatch_message(websocket, data)
+
+    async def merged_transactions(self, data):
+        """One page of every shard's transactions, merged in timestamp order
+
+        Each shard pages through its own journal, so the cursor is a list
+        with one entry per shard: null before its first page, the last id
+        taken from it, or "end" once it has nothing left.
+        """
+        limit = max(1, min(int(data.get("limit", 100)), MAX_PAGE_SIZE))
+        descending = bool(data.get("descending", False))
+        cursors = data.get("cursor") or [None] * len(self.links)
+        if not isinstance(cursors, list) or len(cursors) != len(self.links):
+            return {"status": "error", "message": "Invalid cursor"}
+
+        query = {key: data[key] for key in ("start", "end") if key in data}
+        active = [link for link in self.links if cursors[link.shard_id] != "end"]
+        responses = await asyncio.gather(*(
+            self.request(link, dict(query, action="get_transactions", cursor=cursors[link.shard_id],
+                                    limit=limit, descending=descending))
+            for link in active
+        ))
+        failed = [response for response in responses if response.get("status") != "success"]
+        if failed:
+            return failed[0]
+
+        # Merging keeps each shard's page in its own order, so what is taken from a shard is a prefix of its page
+        pages = [tag_shard(link, response)["data"] for link, response in zip(active, responses)]
+        merged = heapq.merge(*pages, key=lambda record: record["timestamp"], reverse=descending)
+        page = list(itertools.islice(merged, limit))
+
+        next_cursors = list(cursors)
+        for link, response, shard_page in zip(active, responses, pages):
+            taken = sum(1 for record in page if record["shard"] == link.shard_id)
+            if taken == len(shard_page) and response.get("next_cursor") is None:
+                next_cursors[link.shard_id] = "end"
+            elif taken:
+                next_cursors[link.shard_id] = shard_page[taken - 1]["id"]
+        next_cursor = None if all(cursor == "end" for cursor in next_cursors) else next_cursors
+        return {"status": "success", "data": page, "next_cursor": next_cursor}
+
+    def relay(self, websocket, request, response):
+        response.pop("id", None)
+        self.respond(websocket, request, response)
+
+    async def check_meme_trends(self):
+        """Shards poll the trends file themselves; scores reach the gateway with their updates"""
+
+    def add_replica_asset(self, asset_id, asset_data):
+        slot = self.engine.add_asset(asset_id, asset_data)
+        self.reset_slot(slot)
+        return slot
+
+    def apply_shard_state(self, link, message):
+        """Replace a shard's assets in the replica with a full snapshot"""
+        for asset_id in link.assets - set(message["data"]):
+            self.engine.remove_asset(asset_id)
+            link.assets.discard(asset_id)
+        for asset_id, asset_data in message["data"].items():
+            if asset_id in self.engine:
+                slot = self.engine.slots[asset_id]
+                self.apply_fields(slot, asset_data)
+                self.history.reset(slot)
+            else:
+                slot = self.add_replica_asset(asset_id, asset_data)
+            for point in asset_data.get("history", []):
+                self.history.append(slot, epoch_timestamp(point["timestamp"]), point["price"])
+            link.assets.add(asset_id)
+        link.sequence = message["seq"]
+        link.resyncing = False
+
+        # Clients may hold deltas of the old state, so everyone starts over from a snapshot
+        self.sequence += 1
+        self.mark_broadcast()
+        for websocket, connection in self.clients.connections.items():
+            self.clients.send(websocket, self.encode_market_state(connection.assets, connection.codec))
+        link.ready.set()
+
+    def apply_fields(self, slot, changes):
+        engine = self.engine
+        for field in ("price", "supply", "market_cap", "volume"):
+            if field in changes:
+                engine.column(field)[slot] = changes[field]
+        if "modifiers" in changes:
+            impacts = [m["impact"] for m in changes["modifiers"] if m["type"] == "meme_trend"]
+            if impacts:
+                engine.set_trend_impact(engine.ids[slot], impacts[0])
+
+    def apply_shard_update(self, link, message):
+        """Fold a shard's market_update into the replica, or resync the shard on a gap"""
+        if link.sequence is None or message["seq"] != link.sequence + 1:
+            if not link.resyncing:
+                link.resyncing = True
+                asyncio.ensure_future(link.websocket.send(json.dumps({"action": "resync"})))
+            return
+        link.sequence = message["seq"]
+        for asset_id, changes in message["data"].items():
+            if asset_id in self.engine:
+                slot = self.engine.slots[asset_id]
+                self.apply_fields(slot, changes)
+            else:
+                slot = self.add_replica_asset(asset_id, changes)
+                link.assets.add(asset_id)
+            for point in changes.get("history", []):
+                self.history.append(slot, epoch_timestamp(point["timestamp"]), point["price"])
+        for asset_id in message.get("removed", []):
+            if asset_id in self.engine:
+                self.engine.remove_asset(asset_id)
+            link.assets.discard(asset_id)
+        self.dirty = True
+
+    def handle_shard_message(self, link, message):
+        request_id = message.get("id")
+        if request_id in self.pending:
+            _, callback = self.pending.pop(request_id)
+            callback(message)
+        elif message.get("type") == "market_state":
+            self.apply_shard_state(link, message)
+        elif message.get("type") == "market_update":
+            self.apply_shard_update(link, message)
+        elif message.get("type") in ("trades", "candles"):
+            # Fills accumulate until the next broadcast; only the newest open bars are kept
+            channel = TRADES if message["type"] == "trades" else CANDLES
+            buffered = self.buffered_topics.setdefault(channel, {})
+            for asset_id, value in message["data"].items():
+                if channel == TRADES:
+                    buffered.setdefault(asset_id, []).extend(value)
+                else:
+                    buffered[asset_id] = value
+        elif message.get("type") == "meme_trends":
+            # Every shard reads the same trends, so only the first copy is passed on
+            if message.get("timestamp") != self.meme_trends_timestamp or not self.meme_trends:
+                self.meme_trends = message["data"]
+                self.meme_trends_timestamp = message.get("timestamp")
+                self.publish_topics(TRENDS, {"type": "meme_trends", "timestamp": message.get("timestamp")},
+                                    message["data"], skip_empty=True)
+
+    async def shard_link(self, link):
+        """Keep a connection to one shard, reconnecting if it drops"""
+        while True:
+            try:
+                async with websockets.connect(link.uri, max_size=None, ping_interval=None) as websocket:
+                    link.websocket = websocket
+                    # Ticks are on by default; the first message is the shard's market_state
+                    await websocket.send(json.dumps({"action": "subscribe", "channels": [TRADES, CANDLES, TRENDS]}))
+                    logger.info(f"Connected to shard {link.shard_id} at {link.uri}")
+                    async for raw in websocket:
+                        self.handle_shard_message(link, json.loads(raw))
+            except (OSError, websockets.ConnectionClosed) as e:
+                logger.warning(f"Shard {link.shard_id} unavailable: {e}")
+            except Exception as e:
+                # A shard still starting up or a message that cannot be applied; reconnect for a fresh state
+                logger.error(f"Error in connection to shard {link.shard_id}: {e}")
+            finally:
+                link.websocket = None
+                link.sequence = None
+                link.resyncing = False
+                # Requests the shard never answered
+                for request_id, (shard_id, callback) in list(self.pending.items()):
+                    if shard_id == link.shard_id:
+                        del self.pending[request_id]
+                        callback({"status": "error", "message": "Shard unavailable"})
+            await asyncio.sleep(0.5)
+
+    async def update_market(self):
+        """Broadcast the merged shard updates since the last broadcast"""
+        if not self.dirty and not self.buffered_topics:
+            return
+        self.dirty = False
+        started = time.perf_counter()
+        await self.broadcast_market_update()
+        topics, self.buffered_topics = self.buffered_topics, {}
+        for channel, data in topics.items():
+            self.publish_topics(channel, {"type": channel, "seq": self.sequence}, data, skip_empty=True)
+        self.tick_seconds.observe(time.perf_counter() - started)
+
+    async def run(self):
+        """Connect to every shard, then serve clients from the merged replica"""
+        links = [asyncio.create_task(self.shard_link(link)) for link in self.links]
+        await asyncio.gather(*(link.ready.wait() for link in self.links))
+        logger.info(f"Gateway replica holds {len(self.engine)} assets from {len(self.links)} shards")
+
+        server = await websockets.serve(
+            lambda ws, path=None: self.handler(ws, path),
+            "localhost",
+            self.port,
+            process_request=self.process_request
+        )
+        logger.info(f"Market gateway started on port {self.port}")
+
+        self.scheduler.add("merge", self.merge_interval, self.update_market)
+        try:
+            await self.scheduler.run()
+        finally:
+            server.close()
+            for task in links:
+                task.cancel()
+
+
+def run_shard(shard_id, shard_count, port, data_dir):
+    """Process entry point for one shard server"""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s - shard {shard_id} - %(levelname)s - %(message)s")
+    server = MarketServer(
+        port=port,
+        journal_file=os.path.join(data_dir, f"transactions-shard{shard_id}.db"),
+        recorder_dir=os.path.join(data_dir, f"market_changes-shard{shard_id}"),
+        snapshot_file=os.path.join(data_dir, f"market_snapshot-shard{shard_id}.npz"),
+        asset_filter=ShardOwnership(shard_id, shard_count)
+    )
+    server.excel_file = os.path.join(data_dir, f"market_changes-shard{shard_id}.xlsx")
+    asyncio.run(server.run())
+
+
+def run_cluster(shard_count, port=8765, shard_base_port=8800, data_dir="."):
+    """Start one shard process per partition and run the gateway in this process"""
+    context = multiprocessing.get_context("spawn")
+    shards = []
+    for shard_id in range(shard_count):
+        process = context.Process(
+            target=run_shard, args=(shard_id, shard_count, shard_base_port + shard_id, data_dir), daemon=True
+        )
+        process.start()
+        shards.append(process)
+
+    uris = [f"ws://localhost:{shard_base_port + shard_id}" for shard_id in range(shard_count)]
+    try:
+        asyncio.run(MarketGateway(uris, port=port).run())
+    finally:
+        for process in shards:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the market partitioned across shard processes")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="Number of shard processes")
+    parser.add_argument("--port", type=int, default=8765, help="Client-facing gateway port")
+    parser.add_argument("--shard-base-port", type=int, default=8800, help="Shard i listens on this port + i")
+    parser.add_argument("--data-dir", default=".", help="Where shards keep their journals and recordings")
+    args = parser.parse_args()
+
+    run_cluster(args.shards, port=args.port, shard_base_port=args.shard_base_port, data_dir=args.data_dir)
@@ -0,0 +1,143 @@
+import json
+from datetime import datetime
+from functools import lru_cache
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is optional; JSON is always available
+    msgpack = None
+
+# Wire formats
+JSON = "json"
+MSGPACK = "msgpack"
+
+# Short field ids used by compact formats instead of the JSON key names
+FIELD_IDS = {
+    "type": "t",
+    "seq": "s",
+    "data": "d",
+    "timestamp": "ts",
+    "removed": "rm",
+    "status": "st",
+    "message": "msg",
+    "name": "n",
+    "symbol": "sy",
+    "price": "p",
+    "supply": "su",
+    "market_cap": "mc",
+    "volume": "v",
+    "modifiers": "mo",
+    "impact": "im",
+    "history": "h",
+    "asset_id": "a",
+    "action": "ac",
+    "amount": "am",
+    "total": "tt",
+    "next_cursor": "nc",
+    "start": "sa",
+    "open": "o",
+    "high": "hi",
+    "low": "lo",
+    "close": "c",
+}
+FIELD_NAMES = {short: name for name, short in FIELD_IDS.items()}
+
+
+@lru_cache(maxsize=4096)
+def epoch_timestamp(value):
+    """Unix timestamp of an ISO 8601 string, cached since history points repeat across updates"""
+    return datetime.fromisoformat(value).timestamp()
+
+
+def compact(value):
+    """Swap field names for short ids and ISO timestamps for epoch seconds"""
+    if isinstance(value, dict):
+        return {
+            FIELD_IDS.get(key, key): epoch_timestamp(item) if key == "timestamp" and isinstance(item, str) else compact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [compact(item) for item in value]
+    return value
+
+
+def expand(value):
+    """Restore the field names of a compact message; timestamps stay in epoch seconds"""
+    if isinstance(value, dict):
+        return {FIELD_NAMES.get(key, key): expand(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [expand(item) for item in value]
+    return value
+
+
+class JsonCodec:
+    """UTF-8 JSON text frames with the original field names"""
+
+    name = JSON
+    text = True
+
+    def encode(self, message):
+        return json.dumps(message).encode()
+
+    def decode(self, payload):
+        return json.loads(payload)
+
+    def entry(self, key, value):
+        """Encode one key/value pair of a map so it can be spliced into several payloads"""
+        return f"{json.dumps(key)}: {json.dumps(value)}"
+
+    def splice(self, message, entries):
+        """Encode message with a data map made of pre-encoded entries"""
+        head = json.dumps(message)[:-1]
+        separator = ", " if message else ""
+        return f'{head}{separator}"data": {{{", ".join(entries)}}}}}'.encode()
+
+
+class MsgpackCodec:
+    """MessagePack binary frames with short field ids and epoch timestamps"""
+
+    name = MSGPACK
+    text = False
+
+    def encode(self, message):
+        return msgpack.packb(compact(message))
+
+    def decode(self, payload):
+        # Client requests keep the long field names; text frames are read as JSON
+        if isinstance(payload, str):
+            return json.loads(payload)
+        return msgpack.unpackb(payload)
+
+    def entry(self, key, value):
+        return msgpack.packb(key) + msgpack.packb(compact(value))
+
+    def splice(self, message, entries):
+        head = compact(message)
+        parts = [self._map_header(len(head) + 1)]
+        parts.extend(msgpack.packb(key) + msgpack.packb(value) for key, value in head.items())
+        parts.append(msgpack.packb(FIELD_IDS["data"]))
+        parts.append(self._map_header(len(entries)))
+        parts.extend(entries)
+        return b"".join(parts)
+
+    @staticmethod
+    def _map_header(size):
+        if size < 16:
+            return bytes((0x80 | size,))
+        if size < 2 ** 16:
+            return b"\xde" + size.to_bytes(2, "big")
+        return b"\xdf" + size.to_bytes(4, "big")
+
+
+CODECS = {JSON: JsonCodec()}
+if msgpack is not None:
+    CODECS[MSGPACK] = MsgpackCodec()
+
+
+def get_codec(name):
+    """Codec for a wire format name; raises ValueError if unknown or not installed"""
+    if name == MSGPACK and msgpack is None:
+        raise ValueError("MessagePack format requires the msgpack package")
+    if name not in CODECS:
+        raise ValueError(f"Unknown format: {name}")
+    return CODECS[name]
@@ -0,0 +1,337 @@
+import numpy as np
+
+# Per-tick price multiplier range for each asset type
+VOLATILITY_BANDS = {
+    "meme_coin": (0.95, 1.05),     # Meme coins have higher volatility
+    "stable_coin": (0.998, 1.002), # Stable coins have very low volatility
+    "stock": (0.99, 1.01)          # Stocks have medium volatility
+}
+DEFAULT_VOLATILITY_BAND = VOLATILITY_BANDS["stock"]
+
+# Numeric columns kept per asset slot
+COLUMNS = ("price", "supply", "market_cap", "volume", "vol_low", "vol_high", "trend_impact")
+
+
+def meme_trend_impact(score):
+    """Per-tick price multiplier of a meme trend score from 0 to 100"""
+    return 0.9 + (score / 500)  # Score 0 -> 0.9, Score 100 -> 1.1
+
+
+def validate_trend_scores(scores):
+    """Raise ValueError unless every meme trend score is a number from 0 to 100"""
+    for asset_id, score in scores.items():
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 100:
+            raise ValueError(f"Invalid meme trend score for {asset_id}: {score!r}")
+
+
+class MarketEngine:
+    """Columnar price state for all assets, advanced in one vectorized step per tick
+
+    Every asset owns a slot; numeric fields live in NumPy arrays indexed by
+    slot and the dict-shaped asset view is only built on demand. Slots of
+    removed assets are freed (their id becomes None) and reused by later
+    additions, so size is the number of slots in use or free, while
+    len() is the number of assets. generation counts the assets a slot
+    has held, so callers can tell a reused slot from an unchanged one.
+    """
+
+    def __init__(self, seed=None, capacity=64):
+        self.rng = np.random.default_rng(seed)
+        self.size = 0
+        self.slots = {}      # asset_id -> slot
+        self.ids = []        # slot -> asset_id, None for a free slot
+        self.info = []       # slot -> static fields (type, name, symbol)
+        self.free = []       # free slots, reused before the arrays grow
+
+        self._columns = {name: np.zeros(capacity) for name in COLUMNS}
+        self._has_trend = np.zeros(capacity, dtype=bool)
+        self._live = np.zeros(capacity, dtype=bool)
+        self._generation = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, asset_id):
+        return asset_id in self.slots
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def column(self, name):
+        """View of a numeric column over the occupied slots"""
+        return self._columns[name][:self.size]
+
+    @property
+    def price(self):
+        return self.column("price")
+
+    @property
+    def supply(self):
+        return self.column("supply")
+
+    @property
+    def market_cap(self):
+        return self.column("market_cap")
+
+    @property
+    def volume(self):
+        return self.column("volume")
+
+    @property
+    def trend_impact(self):
+        return self.column("trend_impact")
+
+    @property
+    def has_trend(self):
+        return self._has_trend[:self.size]
+
+    @property
+    def live(self):
+        """Whether each slot holds an asset"""
+        return self._live[:self.size]
+
+    @property
+    def generation(self):
+        return self._generation[:self.size]
+
+    def _grow(self):
+        capacity = max(2 * len(self._has_trend), 1)
+        for name, values in self._columns.items():
+            grown = np.zeros(capacity)
+            grown[:self.size] = values[:self.size]
+            self._columns[name] = grown
+        for name in ("_has_trend", "_live", "_generation"):
+            values = getattr(self, name)
+            grown = np.zeros(capacity, dtype=values.dtype)
+            grown[:self.size] = values[:self.size]
+            setattr(self, name, grown)
+
+    def add_asset(self, asset_id, asset_data, band=None):
+        """Add an asset from its dict representation and return its slot
+
+        band is the (low, high) per-tick price multiplier range; by default
+        it comes from VOLATILITY_BANDS for the asset's type.
+        """
+        if asset_id in self.slots:
+            raise ValueError(f"Asset already exists: {asset_id}")
+        if self.free:
+            slot = self.free.pop()
+            self.ids[slot] = asset_id
+            self.info[slot] = None
+        else:
+            if self.size == len(self._has_trend):
+                self._grow()
+            slot = self.size
+            self.size += 1
+            self.ids.append(asset_id)
+            self.info.append(None)
+        self.slots[asset_id] = slot
+        self._live[slot] = True
+        self._generation[slot] += 1
+
+        columns = self._columns
+        columns["price"][slot] = asset_data["price"]
+        columns["supply"][slot] = asset_data["supply"]
+        columns["market_cap"][slot] = asset_data.get("market_cap", asset_data["price"] * asset_data["supply"])
+        columns["volume"][slot] = asset_data.get("volume", 0.0)
+        self._has_trend[slot] = False
+        columns["trend_impact"][slot] = 1.0
+        self.update_asset(asset_id, asset_data, band)
+        return slot
+
+    def update_asset(self, asset_id, asset_data, band=None):
+        """Update the static fields, supply, volatility band and modifiers of an asset
+
+        Price and volume are market state and are left alone; a supply
+        change moves the market cap. An asset that already follows meme
+        trends keeps its current trend impact.
+        """
+        slot = self.slots[asset_id]
+        self.info[slot] = {
+            "type": asset_data["type"],
+            "name": asset_data.get("name", asset_id),
+            "symbol": asset_data.get("symbol", asset_id)
+        }
+
+        low, high = band or VOLATILITY_BANDS.get(asset_data["type"], DEFAULT_VOLATILITY_BAND)
+        columns = self._columns
+        columns["vol_low"][slot] = low
+        columns["vol_high"][slot] = high
+        if "supply" in asset_data and asset_data["supply"] != columns["supply"][slot]:
+            columns["supply"][slot] = asset_data["supply"]
+            columns["market_cap"][slot] = columns["price"][slot] * asset_data["supply"]
+
+        # Only the meme trend modifier is modelled; several multiply together
+        if "modifiers" not in asset_data:
+            self._has_trend[slot] = False
+            columns["trend_impact"][slot] = 1.0
+        elif not self._has_trend[slot]:
+            impacts = [m["impact"] for m in asset_data["modifiers"] if m["type"] == "meme_trend"]
+            columns["trend_impact"][slot] = np.prod(impacts) if impacts else 1.0
+            self._has_trend[slot] = True
+
+    def remove_asset(self, asset_id):
+        """Remove an asset and free its slot for reuse; returns the freed slot"""
+        slot = self.slots.pop(asset_id)
+        self.ids[slot] = None
+        self.info[slot] = None
+        self.free.append(slot)
+        self._live[slot] = False
+        self._has_trend[slot] = False
+
+        # A free slot stays at zero and never moves
+        for name in ("price", "supply", "market_cap", "volume"):
+            self._columns[name][slot] = 0.0
+        for name in ("vol_low", "vol_high", "trend_impact"):
+            self._columns[name][slot] = 1.0
+        return slot
+
+    def set_trend_impact(self, asset_id, impact):
+        """Set the meme trend multiplier applied to an asset every tick"""
+        slot = self.slots[asset_id]
+        self._columns["trend_impact"][slot] = impact
+        self._has_trend[slot] = True
+
+    def step(self, slots=None):
+        """Advance every asset by one tick and return the volume traded per slot
+
+        With slots, only those slots move and the traded volume is
+        returned for each of them in order.
+        """
+        if slots is not None:
+            return self._step_slots(np.asarray(slots, dtype=np.intp))
+        n = self.size
+        low = self.column("vol_low")
+        high = self.column("vol_high")
+
+        # Apply natural market movement scaled by any meme trend impact
+        volatility = low + (high - low) * self.rng.random(n)
+        volatility *= self.trend_impact
+
+        price = self.price
+        price *= volatility
+        np.multiply(price, self.supply, out=self.market_cap)
+
+        # Add some random trading volume
+        traded = self.rng.random(n) * (self.market_cap * 0.001)
+        volume = self.volume
+        volume += traded
+        return traded
+
+    def _step_slots(self, slots):
+        low = self.column("vol_low")[slots]
+        high = self.column("vol_high")[slots]
+        volatility = low + (high - low) * self.rng.random(len(slots))
+        volatility *= self.trend_impact[slots]
+
+        price = self.price[slots] * volatility
+        market_cap = price * self.supply[slots]
+        self.price[slots] = price
+        self.market_cap[slots] = market_cap
+
+        traded = self.rng.random(len(slots)) * (market_cap * 0.001)
+        self.volume[slots] += traded
+        return traded
+
+    def step_many(self, ticks):
+        """Advance every asset by several ticks in one vectorized pass
+
+        Gives bit-for-bit the same state and random stream as calling
+        step() ticks times. Returns the price after each tick and the
+        volume traded in each tick, both shaped (ticks, size).
+        """
+        n = self.size
+        low = self.column("vol_low")
+        high = self.column("vol_high")
+
+        # step() draws the volatility then the traded volume of each tick in turn
+        draws = self.rng.random((ticks, 2, n))
+        volatility = low + (high - low) * draws[:, 0]
+        volatility *= self.trend_impact
+
+        # Accumulating from the current row multiplies in the same order as step()
+        path = np.empty((ticks + 1, n))
+        path[0] = self.price
+        path[1:] = volatility
+        np.multiply.accumulate(path, axis=0, out=path)
+        prices = path[1:]
+        market_cap = prices * self.supply
+
+        traded = draws[:, 1] * (market_cap * 0.001)
+        volume = np.empty((ticks + 1, n))
+        volume[0] = self.volume
+        volume[1:] = traded
+        np.add.accumulate(volume, axis=0, out=volume)
+
+        self.price[:] = prices[-1]
+        self.market_cap[:] = market_cap[-1]
+        self.volume[:] = volume[-1]
+        return prices, traded
+
+    def apply_orders(self, slots, signed_amounts):
+        """Apply net order flow per slot and return the pre-trade fill price of each order
+
+        Buy amounts are positive and sell amounts negative. Every order fills
+        at its asset's price before the batch is applied. Also returns the
+        slots touched by the batch and the volume traded in each of them.
+        """
+        slots = np.asarray(slots, dtype=np.intp)
+        signed_amounts = np.asarray(signed_amounts, dtype=np.float64)
+        fill_prices = self.price[slots]
+
+        net = np.bincount(slots, weights=signed_amounts, minlength=self.size)
+        traded = np.bincount(slots, weights=np.abs(signed_amounts) * fill_prices, minlength=self.size)
+        touched = np.flatnonzero(np.bincount(slots, minlength=self.size))
+        self.volume[touched] += traded[touched]
+
+        # Buy pressure increases price, sell pressure decreases it
+        price_impact = (net[touched] / self.market_cap[touched]) * 100
+        self.price[touched] *= (1 + (price_impact * 0.01))
+        self.market_cap[touched] = self.price[touched] * self.supply[touched]
+        return fill_prices, touched, traded[touched]
+
+    def state(self):
+        """Copy of every occupied slot, for snapshots"""
+        state = {name: values[:self.size].copy() for name, values in self._columns.items()}
+        state["has_trend"] = self._has_trend[:self.size].copy()
+        state["live"] = self._live[:self.size].copy()
+        state["generation"] = self._generation[:self.size].copy()
+        state["ids"] = list(self.ids)
+        state["info"] = [dict(info) if info is not None else None for info in self.info]
+        return state
+
+    def load_state(self, state):
+        """Replace every asset with the contents of a snapshot taken by state()"""
+        size = len(state["ids"])
+        capacity = max(size, len(self._has_trend))
+        for name in COLUMNS:
+            values = np.zeros(capacity)
+            values[:size] = state[name]
+            self._columns[name] = values
+        self._has_trend = np.zeros(capacity, dtype=bool)
+        self._has_trend[:size] = state["has_trend"]
+        self._live = np.zeros(capacity, dtype=bool)
+        self._live[:size] = [asset_id is not None for asset_id in state["ids"]]
+        self._generation = np.zeros(capacity, dtype=np.int64)
+        self._generation[:size] = state.get("generation", 1)
+        self.size = size
+        self.ids = list(state["ids"])
+        self.info = [dict(info) if info is not None else None for info in state["info"]]
+        self.slots = {asset_id: slot for slot, asset_id in enumerate(self.ids) if asset_id is not None}
+        self.free = [slot for slot, asset_id in enumerate(self.ids) if asset_id is None]
+
+    def asset_dict(self, slot):
+        """Project one slot back to the dict shape clients expect"""
+        columns = self._columns
+        asset = dict(self.info[slot])
+        asset["price"] = float(columns["price"][slot])
+        asset["supply"] = float(columns["supply"][slot])
+        asset["market_cap"] = float(columns["market_cap"][slot])
+        asset["volume"] = float(columns["volume"][slot])
+        if self._has_trend[slot]:
+            asset["modifiers"] = [{"type": "meme_trend", "impact": float(columns["trend_impact"][slot])}]
+        return asset
+
+    def to_dict(self):
+        """Project every asset back to the dict shape clients expect"""
+        return {asset_id: self.asset_dict(slot) for asset_id, slot in self.slots.items()}
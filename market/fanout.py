@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from codec import CODECS, JSON
+
+logger = logging.getLogger(__name__)
+
+# Slow consumer policies
+COALESCE = "coalesce"      # Drop queued updates and send the latest full state instead
+DISCONNECT = "disconnect"  # Close the connection once its queue is full
+
+# Subscription channels
+TICKS = "ticks"      # market_update deltas, one per sequence number
+TRADES = "trades"    # Fills of every order batch
+CANDLES = "candles"  # Open OHLCV bars after every tick
+TRENDS = "trends"    # Meme trend scores as they are applied
+CHANNELS = (TICKS, TRADES, CANDLES, TRENDS)
+DEFAULT_CHANNELS = (TICKS,)
+
+
+class ClientConnection:
+    """A websocket with its own bounded outbound queue and writer task"""
+
+    def __init__(self, websocket, max_queue=256, slow_policy=COALESCE, send_histogram=None, codec=None):
+        self.websocket = websocket
+        self.codec = codec or CODECS[JSON]  # Wire format negotiated at connect time
+        self.max_queue = max_queue
+        self.slow_policy = slow_policy
+        self.send_histogram = send_histogram  # Optional metrics histogram of send durations
+        self.connected_at = time.time()
+        self.closed = False
+
+        # Subscription: watched asset ids (None for every asset) and channels
+        self.assets = None
+        self.channels = set(DEFAULT_CHANNELS)
+
+        # Queue entries are (payload, droppable, enqueued_at). Market updates
+        # are droppable and may be coalesced; request responses never are.
+        self._queue = deque()
+        self._responses = 0  # Queued entries that are not droppable
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+
+        # Lag counters
+        self.sent = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.last_send_lag = 0.0
+        self.max_send_lag = 0.0
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    def enqueue(self, payload, droppable=True, snapshot=None):
+        """Queue an encoded payload, applying the slow consumer policy when full"""
+        if self.closed:
+            return False
+
+        if not droppable and self._responses >= self.max_queue:
+            # Responses cannot be coalesced, so a client that stops reading them is dropped
+            logger.warning(f"Disconnecting client after {self._responses} unread responses")
+            self.close()
+            return False
+
+        if droppable and len(self._queue) >= self.max_queue:
+            if self.slow_policy == DISCONNECT or snapshot is None:
+                logger.warning(f"Disconnecting slow client after {len(self._queue)} queued messages")
+                self.close()
+                return False
+
+            # Replace every queued update with one copy of the latest full state
+            kept = deque(entry for entry in self._queue if not entry[1])
+            self.coalesced += len(self._queue) - len(kept) + 1
+            self._queue = kept
+            payload = snapshot()
+
+        self._queue.append((payload, droppable, time.monotonic()))
+        if not droppable:
+            self._responses += 1
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._wakeup.set()
+        return True
+
+    async def _writer(self):
+        """Send queued payloads to the websocket in order"""
+        try:
+            while True:
+                while not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+
+                payload, droppable, enqueued_at = self._queue.popleft()
+                if not droppable:
+                    self._responses -= 1
+                # Payloads are pre-encoded; JSON goes out as text frames, binary formats as binary
+                started = time.perf_counter()
+                await self.websocket.send(payload, text=self.codec.text)
+                if self.send_histogram is not None:
+                    self.send_histogram.observe(time.perf_counter() - started)
+                self.sent += 1
+                self.last_send_lag = time.monotonic() - enqueued_at
+                self.max_send_lag = max(self.max_send_lag, self.last_send_lag)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(f"Client writer stopped: {e}")
+            self.closed = True
+            self._queue.clear()
+            self._responses = 0
+
+    def close(self):
+        """Stop the writer task and close the underlying websocket"""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._responses = 0
+        self._task.cancel()
+        asyncio.create_task(self.websocket.close())
+
+    def stats(self):
+        return {
+            "queue_depth": len(self._queue),
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "last_send_lag": self.last_send_lag,
+            "max_send_lag": self.max_send_lag,
+            "connected_for": time.time() - self.connected_at,
+            "closed": self.closed,
+            "format": self.codec.name,
+            "assets": sorted(self.assets) if self.assets is not None else "*",
+            "channels": sorted(self.channels)
+        }
+
+
+class FanOut:
+    """Encode-once broadcaster over per-client bounded send queues"""
+
+    def __init__(self, max_queue=256, slow_policy=COALESCE, send_histogram=None):
+        if slow_policy not in (COALESCE, DISCONNECT):
+            raise ValueError(f"Unknown slow consumer policy: {slow_policy}")
+        self.max_queue = max_queue
+        self.slow_policy = slow_policy
+        self.send_histogram = send_histogram
+        self.connections = {}
+        self.disconnected_slow = 0
+
+        # Subscription index: asset id -> websockets watching it, plus the
+        # websockets watching every asset. Groups of connections with the
+        # same subscription are cached per channel until it changes.
+        self.watchers = {}
+        self.wildcard = set()
+        self._groups = {}
+
+    def __len__(self):
+        return len(self.connections)
+
+    def __bool__(self):
+        return bool(self.connections)
+
+    def __iter__(self):
+        return iter(self.connections)
+
+    def add(self, websocket, codec=None):
+        connection = ClientConnection(websocket, self.max_queue, self.slow_policy, self.send_histogram, codec)
+        self.connections[websocket] = connection
+        self._index(websocket, None, connection.assets)
+        return connection
+
+    def remove(self, websocket):
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        self._index(websocket, connection.assets, None)
+        if not connection.closed:
+            connection._task.cancel()
+            connection.closed = True
+
+    def _index(self, websocket, old_assets, new_assets):
+        """Move a websocket between entries of the asset index"""
+        if old_assets is None:
+            self.wildcard.discard(websocket)
+        else:
+            for asset_id in old_assets:
+                watchers = self.watchers.get(asset_id)
+                if watchers is not None:
+                    watchers.discard(websocket)
+                    if not watchers:
+                        del self.watchers[asset_id]
+        if websocket in self.connections:
+            if new_assets is None:
+                self.wildcard.add(websocket)
+            else:
+                for asset_id in new_assets:
+                    self.watchers.setdefault(asset_id, set()).add(websocket)
+        self._groups = {}
+
+    def subscribe(self, websocket, assets=None, channels=None):
+        """Add assets and channels to a client's subscription
+
+        A new connection watches every asset; its first asset subscription
+        narrows it to the listed assets. assets="*" watches every asset again.
+        """
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return None
+        old_assets = connection.assets
+        if assets == "*":
+            connection.assets = None
+        elif assets:
+            connection.assets = (connection.assets or set()) | set(assets)
+        if channels:
+            connection.channels |= set(channels)
+        self._index(websocket, old_assets, connection.assets)
+        return connection
+
+    def unsubscribe(self, websocket, assets=None, channels=None, known_assets=()):
+        """Remove assets and channels from a client's subscription
+
+        Unsubscribing assets from a connection that watches every asset
+        leaves it watching the rest of known_assets.
+        """
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return None
+        old_assets = connection.assets
+        if assets == "*":
+            connection.assets = set()
+        elif assets:
+            current = set(known_assets) if connection.assets is None else connection.assets
+            connection.assets = current - set(assets)
+        if channels:
+            connection.channels -= set(channels)
+        self._index(websocket, old_assets, connection.assets)
+        return connection
+
+    def watched_assets(self):
+        """Asset ids with at least one watcher, or None if any client watches every asset"""
+        if self.wildcard:
+            return None
+        return self.watchers.keys()
+
+    def groups(self, channel):
+        """Open connections subscribed to a channel, grouped by watched assets and wire format
+
+        Keys are (assets, codec) pairs, where assets is a frozenset of asset
+        ids or None for every asset.
+        """
+        groups = self._groups.get(channel)
+        if groups is None:
+            groups = {}
+            for connection in self.connections.values():
+                if channel in connection.channels:
+                    assets = None if connection.assets is None else frozenset(connection.assets)
+                    groups.setdefault((assets, connection.codec), []).append(connection)
+            self._groups[channel] = groups
+        return groups
+
+    def send(self, websocket, payload):
+        """Queue a response for one client; responses are never coalesced"""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.enqueue(payload, droppable=False)
+
+    def send_message(self, websocket, message):
+        """Encode a response in the client's wire format and queue it"""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.enqueue(connection.codec.encode(message), droppable=False)
+
+    def publish(self, payload, snapshot=None, connections=None):
+        """Queue one shared payload for every client, or only the given connections
+
+        snapshot is an optional callable returning the encoded latest full
+        state, used to coalesce the queue of a slow client. It is called at
+        most once per publish.
+        """
+        cache = []
+
+        def shared_snapshot():
+            if not cache:
+                cache.append(snapshot())
+            return cache[0]
+
+        if connections is None:
+            connections = list(self.connections.values())
+        for connection in connections:
+            if connection.closed:
+                continue
+            if not connection.enqueue(payload, snapshot=shared_snapshot if snapshot else None):
+                self.disconnected_slow += 1
+
+    def queue_depths(self):
+        """Total and largest outbound queue depth across clients"""
+        depths = [connection.depth for connection in self.connections.values()]
+        return sum(depths), max(depths, default=0)
+
+    def stats(self):
+        return {
+            "clients": len(self.connections),
+            "slow_policy": self.slow_policy,
+            "max_queue": self.max_queue,
+            "disconnected_slow": self.disconnected_slow,
+            "connections": [
+                dict(connection.stats(), remote=str(getattr(websocket, "remote_address", "")))
+                for websocket, connection in self.connections.items()
+            ]
+        }
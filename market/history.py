@@ -0,0 +1,121 @@
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=4096)
+def iso_timestamp(timestamp):
+    """ISO-8601 string for an epoch timestamp (ticks share one timestamp, so cache it)"""
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+class PriceHistory:
+    """Fixed-capacity ring buffers of (timestamp, price) points, one row per asset slot
+
+    Timestamps are float64 epoch seconds. counts holds the total number of
+    points ever written to each row, so the write position is
+    counts % capacity and callers can ask for points written after a given
+    count without copying the buffer.
+    """
+
+    def __init__(self, capacity=100, rows=64):
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1")
+        self.capacity = capacity
+        self.timestamps = np.zeros((rows, capacity))
+        self.prices = np.zeros((rows, capacity))
+        self.counts = np.zeros(rows, dtype=np.int64)
+
+    @property
+    def rows(self):
+        return len(self.counts)
+
+    def ensure_rows(self, rows):
+        """Grow the buffers to hold at least the given number of rows"""
+        if rows <= self.rows:
+            return
+        new_rows = max(rows, 2 * self.rows)
+        for name in ("timestamps", "prices"):
+            grown = np.zeros((new_rows, self.capacity))
+            grown[:self.rows] = getattr(self, name)
+            setattr(self, name, grown)
+        counts = np.zeros(new_rows, dtype=np.int64)
+        counts[:self.rows] = self.counts
+        self.counts = counts
+
+    def reset(self, row):
+        """Forget every point of a row so its slot can be reused"""
+        self.counts[row] = 0
+
+    def append(self, row, timestamp, price):
+        """Append one point to a row, overwriting the oldest when full"""
+        position = self.counts[row] % self.capacity
+        self.timestamps[row, position] = timestamp
+        self.prices[row, position] = price
+        self.counts[row] += 1
+
+    def append_rows(self, rows, timestamp, prices):
+        """Append one point to each of the given rows in a single vectorized step"""
+        rows = np.asarray(rows, dtype=np.intp)
+        positions = self.counts[rows] % self.capacity
+        self.timestamps[rows, positions] = timestamp
+        self.prices[rows, positions] = prices
+        self.counts[rows] += 1
+
+    def state(self, rows):
+        """Copy of the first rows, for snapshots"""
+        return {
+            "timestamps": self.timestamps[:rows].copy(),
+            "prices": self.prices[:rows].copy(),
+            "counts": self.counts[:rows].copy()
+        }
+
+    def load_state(self, state):
+        """Replace the buffers with a snapshot taken by state(), replaying it if the capacity changed"""
+        rows = len(state["counts"])
+        self.counts = np.zeros(max(rows, self.rows), dtype=np.int64)
+        self.timestamps = np.zeros((len(self.counts), self.capacity))
+        self.prices = np.zeros((len(self.counts), self.capacity))
+        if state["timestamps"].shape[1:] == (self.capacity,):
+            self.timestamps[:rows] = state["timestamps"]
+            self.prices[:rows] = state["prices"]
+            self.counts[:rows] = state["counts"]
+            return
+        saved = PriceHistory(state["timestamps"].shape[1], rows)
+        saved.timestamps, saved.prices, saved.counts = state["timestamps"], state["prices"], state["counts"]
+        for row in range(rows):
+            for timestamps, prices in saved.segments(row):
+                for timestamp, price in zip(timestamps.tolist(), prices.tolist()):
+                    self.append(row, timestamp, price)
+
+    def segments(self, row, since=0, until=None):
+        """Zero-copy views of the points of a row written in [since, until), oldest first
+
+        Returns a list of at most two (timestamps, prices) view pairs, as the
+        requested range may wrap around the end of the ring.
+        """
+        total = int(self.counts[row])
+        count = total if until is None else min(int(until), total)
+        # Points older than the last capacity writes have been overwritten
+        start = max(int(since), total - self.capacity, 0)
+        if start >= count:
+            return []
+
+        first = start % self.capacity
+        last = (count - 1) % self.capacity + 1
+        timestamps = self.timestamps[row]
+        prices = self.prices[row]
+        if first < last:
+            return [(timestamps[first:last], prices[first:last])]
+        return [(timestamps[first:], prices[first:]), (timestamps[:last], prices[:last])]
+
+    def points(self, row, since=0, until=None):
+        """Points of a row as the list of {"timestamp", "price"} dicts clients expect"""
+        points = []
+        for timestamps, prices in self.segments(row, since, until):
+            points.extend(
+                {"timestamp": iso_timestamp(timestamp), "price": price}
+                for timestamp, price in zip(timestamps.tolist(), prices.tolist())
+            )
+        return points
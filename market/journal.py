@@ -0,0 +1,170 @@
+import logging
+import queue
+import sqlite3
+import threading
+
+from history import iso_timestamp
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    asset_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    amount REAL NOT NULL,
+    price REAL NOT NULL,
+    total REAL NOT NULL,
+    post_price REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_asset ON transactions (asset_id, id);
+CREATE INDEX IF NOT EXISTS transactions_time ON transactions (timestamp);
+"""
+
+COLUMNS = ("id", "timestamp", "asset_id", "action", "amount", "price", "total", "post_price")
+
+# Largest page get_transactions will return
+MAX_PAGE_SIZE = 1000
+
+
+class TransactionJournal:
+    """Append-only SQLite (WAL mode) journal of filled transactions
+
+    Appends are queued and written by a background thread that commits
+    everything queued so far in one transaction (group commit), so the
+    event loop never waits on disk. Ids are assigned at append time.
+    """
+
+    def __init__(self, path="transactions.db", max_batch=1000):
+        self.path = path
+        self.max_batch = max_batch
+        self.next_id = 1
+        self._queue = queue.Queue()
+        self._writer = None
+        self._local = threading.local()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def open(self):
+        """Create the schema and start the writer thread"""
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        last_id = connection.execute("SELECT MAX(id) FROM transactions").fetchone()[0]
+        self.next_id = (last_id or 0) + 1
+
+        self._writer = threading.Thread(target=self._write_loop, args=(connection,), daemon=True)
+        self._writer.start()
+        logger.info(f"Transaction journal {self.path} opened at id {self.next_id}")
+
+    def append(self, entries):
+        """Queue transactions for writing and return their ids
+
+        entries are (timestamp, asset_id, action, amount, price, total,
+        post_price) tuples.
+        """
+        ids = list(range(self.next_id, self.next_id + len(entries)))
+        self.next_id += len(entries)
+        self._queue.put([(entry_id,) + tuple(entry) for entry_id, entry in zip(ids, entries)])
+        return ids
+
+    def _write_loop(self, connection):
+        """Commit queued entries in groups until closed"""
+        while True:
+            batch = self._queue.get()
+            stop = batch is None
+            rows = [] if stop else list(batch)
+
+            # Group everything that queued up while the last commit ran
+            while not stop and len(rows) < self.max_batch:
+                try:
+                    batch = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if batch is None:
+                    stop = True
+                else:
+                    rows.extend(batch)
+
+            if rows:
+                try:
+                    with connection:
+                        connection.executemany(
+                            "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+                        )
+                except Exception as e:
+                    logger.error(f"Error writing {len(rows)} journal entries: {e}")
+            if stop:
+                connection.close()
+                return
+
+    def close(self):
+        """Flush queued entries and stop the writer thread"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def _reader(self):
+        # One read connection per thread; queries run in worker threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def query(self, asset_id=None, start=None, end=None, cursor=None, limit=100, descending=False):
+        """Return a page of transactions and the cursor for the next page
+
+        Pages are ordered by id; cursor is the last id of the previous page.
+        start and end filter by epoch timestamp.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses, params = [], []
+        if asset_id is not None:
+            clauses.append("asset_id = ?")
+            params.append(asset_id)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(float(start))
+        if end is not None:
+            clauses.append("timestamp <= ?")
+            params.append(float(end))
+        if cursor is not None:
+            clauses.append("id < ?" if descending else "id > ?")
+            params.append(int(cursor))
+
+        sql = "SELECT * FROM transactions"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY id {'DESC' if descending else 'ASC'} LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._reader().execute(sql, params).fetchall()
+        page = [self._record(row) for row in rows[:limit]]
+        next_cursor = page[-1]["id"] if len(rows) > limit else None
+        return page, next_cursor
+
+    def _record(self, row):
+        record = dict(zip(COLUMNS, row))
+        record["timestamp"] = iso_timestamp(record["timestamp"])
+        del record["post_price"]
+        return record
+
+    def asset_totals(self, after_id=0):
+        """Per-asset latest post-trade price, its timestamp and traded volume after an id"""
+        rows = self._reader().execute(
+            """
+            SELECT t.asset_id, t.post_price, t.timestamp, totals.volume
+            FROM transactions t
+            JOIN (
+                SELECT asset_id, MAX(id) AS last_id, SUM(total) AS volume
+                FROM transactions WHERE id > ? GROUP BY asset_id
+            ) totals ON t.id = totals.last_id
+            """,
+            (after_id,)
+        ).fetchall()
+        return {asset_id: (post_price, timestamp, volume) for asset_id, post_price, timestamp, volume in rows}
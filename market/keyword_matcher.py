@@ -0,0 +1,115 @@
+from collections import Counter, deque
+
+# Reactions that boost the score of every coin mentioned in the same message
+EMOJIS = ("🚀", "🌙", "💰")
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over the keywords of every tracked coin
+
+    A message is scanned once, character by character, and every keyword
+    occurrence (including overlapping ones such as "doge" inside
+    "doge killer") is reported together with the emoji count, so the cost
+    does not grow with the number of coins or keywords.
+    """
+
+    def __init__(self, keywords_by_coin, emojis=EMOJIS, word_boundary=False):
+        self.emojis = tuple(emojis)
+        self.word_boundary = word_boundary
+        self._table = None
+        self.update(keywords_by_coin)
+
+    def update(self, keywords_by_coin):
+        """Rebuild the automaton if the keyword table changed; returns True if rebuilt"""
+        table = {coin: tuple(keyword.lower() for keyword in keywords) for coin, keywords in keywords_by_coin.items()}
+        if table == self._table:
+            return False
+        self._table = table
+        self._build()
+        return True
+
+    def _build(self):
+        # Each pattern maps to the coins that list it (with multiplicity) or to an emoji
+        patterns = {}
+        for coin, keywords in self._table.items():
+            for keyword in keywords:
+                if keyword:
+                    patterns.setdefault(keyword, Counter())[coin] += 1
+        self._coins_by_pattern = []
+        self._pattern_length = []
+        self._is_emoji = []
+
+        self._goto = [{}]
+        self._output = [[]]
+
+        def add(text, coins, is_emoji):
+            pattern_id = len(self._coins_by_pattern)
+            self._coins_by_pattern.append(coins)
+            self._pattern_length.append(len(text))
+            self._is_emoji.append(is_emoji)
+            node = 0
+            for ch in text:
+                if ch not in self._goto[node]:
+                    self._goto[node][ch] = len(self._goto)
+                    self._goto.append({})
+                    self._output.append([])
+                node = self._goto[node][ch]
+            self._output[node].append(pattern_id)
+
+        for keyword, coins in patterns.items():
+            add(keyword, coins, False)
+        for emoji in self.emojis:
+            add(emoji, None, True)
+
+        # Breadth-first pass to compute failure links and merge outputs
+        self._fail = [0] * len(self._goto)
+        pending = deque(self._goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for ch, child in self._goto[node].items():
+                pending.append(child)
+                if node:
+                    fallback = self._fail[node]
+                    while fallback and ch not in self._goto[fallback]:
+                        fallback = self._fail[fallback]
+                    self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def _at_boundary(self, content, start, end):
+        return (start == 0 or not content[start - 1].isalnum()) and \
+            (end == len(content) or not content[end].isalnum())
+
+    def scan(self, content):
+        """Return the ids of the distinct keywords found in a message and its emoji count"""
+        content = content.lower()
+        goto, fail, output = self._goto, self._fail, self._output
+        lengths, is_emoji = self._pattern_length, self._is_emoji
+        found = set()
+        emoji_count = 0
+
+        node = 0
+        for i, ch in enumerate(content):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pattern_id in output[node]:
+                if is_emoji[pattern_id]:
+                    emoji_count += 1
+                elif pattern_id not in found:
+                    start = i + 1 - lengths[pattern_id]
+                    if not self.word_boundary or self._at_boundary(content, start, i + 1):
+                        found.add(pattern_id)
+        return found, emoji_count
+
+    def matches(self, content):
+        """Number of distinct keywords of each coin found in a message, plus the emoji count"""
+        found, emoji_count = self.scan(content)
+        hits = Counter()
+        for pattern_id in found:
+            hits.update(self._coins_by_pattern[pattern_id])
+        return hits, emoji_count
+
+    def score(self, content):
+        """Score a message: each matched keyword counts 1 plus 2 per reaction emoji"""
+        hits, emoji_count = self.matches(content)
+        return {coin: count * (1 + emoji_count * 2) for coin, count in hits.items()}
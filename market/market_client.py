@@ -0,0 +1,196 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+import websockets
+
+# Asset fields kept in the local table, in display order
+TABLE_FIELDS = ("name", "type", "price", "volume", "market_cap")
+
+
+class MarketClient:
+    """Long-lived market server connection that keeps a local copy of the market
+
+    A background thread owns one websocket and applies the server's
+    market_state snapshots and sequenced market_update deltas to a local
+    asset table and a bounded history ring per asset, resyncing on a
+    sequence gap. Readers get DataFrames built once per version of the
+    data, so repeated reads between updates are served from the cache.
+    Orders go out over the same connection and are matched to their
+    responses by request id.
+    """
+
+    def __init__(self, uri="ws://localhost:8765", max_history=100, timeout=10):
+        self.uri = uri
+        self.max_history = max_history
+        self.timeout = timeout
+        self.connected = False
+        self.last_update = 0
+        self.sequence = None
+
+        self._lock = threading.Lock()
+        self._assets = {}    # asset_id -> fields without history
+        self._history = {}   # asset_id -> deque of (timestamp, price)
+        self._version = 0
+        self._asset_versions = {}  # asset_id -> version its history last changed
+        self._table = None
+        self._table_version = -1
+        self._history_frames = {}  # asset_id -> (version, DataFrame)
+
+        self._loop = None
+        self._websocket = None
+        self._request_ids = itertools.count(1)
+        self._pending = {}   # request id -> future of the response
+        self._thread = None
+
+    def start(self):
+        """Start the connection thread"""
+        if self._thread is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self._run(),), daemon=True)
+            self._thread.start()
+
+    @property
+    def version(self):
+        """Number of market messages applied; changes whenever the data does"""
+        return self._version
+
+    def asset_ids(self):
+        with self._lock:
+            return list(self._assets)
+
+    def asset(self, asset_id):
+        """Current fields of one asset, or None if it is not listed"""
+        with self._lock:
+            asset_data = self._assets.get(asset_id)
+            return dict(asset_data) if asset_data is not None else None
+
+    def table(self):
+        """DataFrame of every asset indexed by asset id, rebuilt only after the data changed"""
+        with self._lock:
+            if self._table_version != self._version:
+                self._table = pd.DataFrame.from_dict(self._assets, orient="index", columns=list(TABLE_FIELDS))
+                self._table_version = self._version
+            return self._table
+
+    def history_frame(self, asset_id):
+        """DataFrame of an asset's recent prices, rebuilt only after its history changed"""
+        with self._lock:
+            version = self._asset_versions.get(asset_id)
+            cached = self._history_frames.get(asset_id)
+            if cached is None or cached[0] != version:
+                points = list(self._history.get(asset_id, ()))
+                cached = (version, pd.DataFrame(points, columns=["timestamp", "price"]))
+                self._history_frames[asset_id] = cached
+            return cached[1]
+
+    def submit_order(self, action, asset_id, amount):
+        """Send a buy or sell order and wait for the server's response"""
+        return self.request({"action": action, "asset_id": asset_id, "amount": float(amount)})
+
+    def submit_batch(self, requests):
+        """Send several orders and queries in one frame; the reply lists their responses in order"""
+        return self.request({"action": "batch", "requests": requests})
+
+    def request(self, message):
+        """Send a request from any thread and wait for the response with the same id"""
+        if self._loop is None or not self.connected:
+            return {"status": "error", "message": "Not connected to the market server"}
+        future = asyncio.run_coroutine_threadsafe(self._request(message), self._loop)
+        try:
+            return future.result(self.timeout)
+        except Exception as e:
+            future.cancel()
+            return {"status": "error", "message": f"No response from the market server: {e!r}"}
+
+    def resync(self):
+        """Ask the server for a fresh market_state"""
+        if self._loop is not None and self.connected:
+            asyncio.run_coroutine_threadsafe(self._send({"action": "resync"}), self._loop)
+
+    async def _send(self, message):
+        await self._websocket.send(json.dumps(message))
+
+    async def _request(self, message):
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._send(dict(message, id=request_id))
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _run(self):
+        """Keep the connection open, reconnecting if it drops"""
+        while True:
+            delay = 1
+            try:
+                async with websockets.connect(self.uri, ping_interval=None, max_size=None) as websocket:
+                    self._websocket = websocket
+                    self.connected = True
+                    async for raw in websocket:
+                        await self._handle(json.loads(raw))
+            except (OSError, websockets.ConnectionClosed):
+                pass
+            except Exception:
+                delay = 3  # Wait longer for other errors
+            self.connected = False
+            self._websocket = None
+            self.sequence = None
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_result({"status": "error", "message": "Connection to the market server lost"})
+            await asyncio.sleep(delay)
+
+    async def _handle(self, message):
+        future = self._pending.get(message.get("id"))
+        if future is not None:
+            if not future.done():
+                future.set_result(message)
+        elif message.get("type") == "market_state":
+            # Full snapshot on connect or after a resync request
+            self._apply(message["data"], reset=True)
+            self.sequence = message["seq"]
+        elif message.get("type") == "market_update":
+            if self.sequence is None:
+                return
+            if message["seq"] != self.sequence + 1:
+                # Missed an update: ask for a fresh snapshot
+                self.sequence = None
+                await self._send({"action": "resync"})
+                return
+            self._apply(message["data"], message.get("removed"))
+            self.sequence = message["seq"]
+
+    def _apply(self, data, removed=None, reset=False):
+        """Fold a snapshot or delta into the local table and history rings"""
+        with self._lock:
+            self._version += 1
+            if reset:
+                self._assets = {}
+                self._history = {}
+            for asset_id, changes in data.items():
+                asset_data = self._assets.setdefault(asset_id, {})
+                for field, value in changes.items():
+                    if field != "history":
+                        asset_data[field] = value
+                if "history" in changes:
+                    ring = self._history.get(asset_id)
+                    if ring is None:
+                        ring = self._history[asset_id] = deque(maxlen=self.max_history)
+                    ring.extend((point["timestamp"], point["price"]) for point in changes["history"])
+                    self._asset_versions[asset_id] = self._version
+            for asset_id in removed or []:
+                self._assets.pop(asset_id, None)
+                self._history.pop(asset_id, None)
+                self._asset_versions.pop(asset_id, None)
+                self._history_frames.pop(asset_id, None)
+            if reset:
+                self._asset_versions = {asset_id: self._version for asset_id in self._assets}
+                self._history_frames = {}
+            self.last_update = time.time()
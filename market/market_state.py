@@ -0,0 +1,44 @@
+from datetime import datetime
+
+
+class MarketStateSnapshot:
+    """Read-only copy of every asset as of one broadcast sequence number
+
+    data maps asset ids to their dict-shaped views and is shared by every
+    reader, so it must not be modified. Each asset is encoded at most
+    once per wire format; market_state messages and get_assets responses
+    for this sequence are spliced from those entries, and the full
+    market_state payload is kept per format.
+    """
+
+    def __init__(self, sequence, data):
+        self.sequence = sequence
+        self.data = data
+        self.timestamp = datetime.now().isoformat()
+        self._entries = {}  # codec name -> asset id -> encoded entry
+        self._states = {}   # codec name -> market_state payload of every asset
+
+    def entries(self, codec):
+        """Encoded entry of every asset in a codec's wire format"""
+        entries = self._entries.get(codec.name)
+        if entries is None:
+            entries = {asset_id: codec.entry(asset_id, value) for asset_id, value in self.data.items()}
+            self._entries[codec.name] = entries
+        return entries
+
+    def encode(self, message, codec, assets=None):
+        """Encode message with the snapshot's assets, or the given subset of them, as its data"""
+        entries = self.entries(codec)
+        if assets is None:
+            return codec.splice(message, list(entries.values()))
+        return codec.splice(message, [entry for asset_id, entry in entries.items() if asset_id in assets])
+
+    def market_state(self, codec, assets=None):
+        """Encoded market_state message of all assets or of the assets a client watches"""
+        message = {"type": "market_state", "seq": self.sequence, "timestamp": self.timestamp}
+        if assets is not None:
+            return self.encode(message, codec, assets)
+        payload = self._states.get(codec.name)
+        if payload is None:
+            payload = self._states[codec.name] = self.encode(message, codec)
+        return payload
@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+from metrics import peak_rss_mb
+from trend_publisher import TrendPublisher
+from trend_scoring import DEFAULT_MEME_COINS, TrendScorer
+
+FILLER_WORDS = ["gm", "lol", "buy", "sell", "hodl", "wen", "pump", "chart", "the", "is", "going", "to", "ser", "ngmi"]
+EMOJIS = ["🚀", "🌙", "💰"]
+
+
+def load_corpus(path):
+    """Read a JSONL corpus of {"timestamp", "channel_id", "content"} messages"""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def synthetic_corpus(count, meme_coins=None, rate=100.0, channels=10, seed=0, start=None):
+    """Generate a reproducible message stream at an average rate of messages per second"""
+    rng = random.Random(seed)
+    keywords = [keyword for keywords in (meme_coins or DEFAULT_MEME_COINS).values() for keyword in keywords]
+    timestamp = time.time() if start is None else start
+    for _ in range(count):
+        timestamp += rng.expovariate(rate)
+        words = [rng.choice(FILLER_WORDS) for _ in range(rng.randint(3, 20))]
+        for _ in range(rng.choice((0, 0, 1, 1, 2))):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        if rng.random() < 0.2:
+            words.append(rng.choice(EMOJIS) * rng.randint(1, 3))
+        yield {"timestamp": timestamp, "channel_id": rng.randrange(channels), "content": " ".join(words)}
+
+
+class ReplayHarness:
+    """Feeds recorded messages through the meme scoring pipeline in virtual time
+
+    Messages go through the same steps as MemeMonitor: channel filter,
+    scoring into the sliding window on arrival, a scan every
+    update_interval seconds of message time and saving the results.
+    """
+
+    def __init__(self, scorer, channels=None, update_interval=60, publisher=None):
+        self.scorer = scorer
+        self.channels = set(channels) if channels else None
+        self.update_interval = update_interval
+        self.publisher = publisher
+        self.latencies = []
+        self.scans = []
+
+    async def run(self, messages):
+        """Replay messages as fast as possible and return the benchmark report"""
+        last_scan = None
+        processed = 0
+        started = time.perf_counter()
+
+        for message in messages:
+            timestamp = message["timestamp"]
+            if last_scan is None:
+                last_scan = timestamp
+
+            # Scans fire on message time, as the monitor's 10-second check would
+            if timestamp - last_scan >= self.update_interval:
+                await self.scan(timestamp)
+                last_scan = timestamp
+
+            if self.channels is not None and message.get("channel_id") not in self.channels:
+                continue
+
+            begin = time.perf_counter_ns()
+            self.scorer.ingest(message["content"], timestamp)
+            self.latencies.append(time.perf_counter_ns() - begin)
+            processed += 1
+
+        if last_scan is not None:
+            await self.scan(last_scan + self.update_interval)
+        elapsed = time.perf_counter() - started
+        return self.report(processed, elapsed)
+
+    async def scan(self, now):
+        begin = time.perf_counter_ns()
+        scores = self.scorer.scan(now)
+        scan_ns = time.perf_counter_ns() - begin
+        if self.publisher is not None:
+            await self.publisher.publish(scores)
+        self.scans.append({"timestamp": now, "scan_us": scan_ns / 1000, "scores": scores})
+
+    def report(self, processed, elapsed):
+        latencies = np.array(self.latencies or [0]) / 1000
+        p50, p90, p99, p999 = np.percentile(latencies, [50, 90, 99, 99.9])
+        scan_us = [scan["scan_us"] for scan in self.scans] or [0]
+        return {
+            "messages": processed,
+            "elapsed_seconds": elapsed,
+            "messages_per_second": processed / elapsed if elapsed > 0 else 0,
+            "latency_us": {"p50": p50, "p90": p90, "p99": p99, "p99.9": p999, "max": float(latencies.max())},
+            "scans": len(self.scans),
+            "scan_us_max": max(scan_us),
+            "peak_rss_mb": peak_rss_mb(),
+            "final_scores": self.scans[-1]["scores"] if self.scans else {}
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a message corpus through the meme scoring pipeline")
+    parser.add_argument("corpus", nargs="?", help="JSONL corpus with timestamp, channel_id and content")
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate this many messages instead of reading a corpus")
+    parser.add_argument("--rate", type=float, default=100.0, help="Synthetic messages per second of message time")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic corpus seed")
+    parser.add_argument("--write-corpus", help="Also save the synthetic corpus to this JSONL file")
+    parser.add_argument("--keywords", help="JSON file with the coin -> keywords table")
+    parser.add_argument("--channel", type=int, action="append", help="Only replay these channel ids")
+    parser.add_argument("--interval", type=float, default=60, help="Seconds of message time between scans")
+    parser.add_argument("--window", type=float, default=60, help="Scoring window in seconds")
+    parser.add_argument("--bucket", type=float, default=1.0, help="Window bucket width in seconds")
+    parser.add_argument("--half-life", type=float, help="Use exponential decay with this half-life in seconds")
+    parser.add_argument("--word-boundary", action="store_true", help="Only match keywords on word boundaries")
+    parser.add_argument("--results-file", help="Save scan results to this trends file, as the monitor does")
+    parser.add_argument("--output", help="Write the benchmark report to this JSON file")
+    args = parser.parse_args()
+
+    if not args.corpus and not args.synthetic:
+        parser.error("give a corpus file or --synthetic N")
+
+    meme_coins = DEFAULT_MEME_COINS
+    if args.keywords:
+        with open(args.keywords) as f:
+            meme_coins = json.load(f)
+
+    if args.synthetic:
+        messages = list(synthetic_corpus(args.synthetic, meme_coins, args.rate, seed=args.seed))
+        if args.write_corpus:
+            with open(args.write_corpus, "w") as f:
+                for message in messages:
+                    f.write(json.dumps(message) + "\n")
+    else:
+        messages = load_corpus(args.corpus)
+
+    scorer = TrendScorer(meme_coins, window=args.window, bucket_seconds=args.bucket,
+                         half_life=args.half_life, word_boundary=args.word_boundary)
+    # Results are only written to the file, never pushed to a live server
+    publisher = TrendPublisher(token="", results_file=args.results_file) if args.results_file else None
+    harness = ReplayHarness(scorer, channels=args.channel, update_interval=args.interval, publisher=publisher)
+    report = asyncio.run(harness.run(messages))
+
+    report["config"] = {
+        "coins": len(meme_coins),
+        "keywords": sum(len(keywords) for keywords in meme_coins.values()),
+        "window": args.window,
+        "bucket": args.bucket,
+        "half_life": args.half_life,
+        "word_boundary": args.word_boundary
+    }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
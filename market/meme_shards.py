@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+import discord
+
+from trend_publisher import TrendPublisher
+from trend_scoring import DEFAULT_MEME_COINS, TrendScorer, normalize_scores
+
+
+def shard_for_guild(guild_id, shard_count):
+    """Shard that Discord delivers a guild's events to"""
+    return (guild_id >> 22) % shard_count
+
+
+class ShardWorker(discord.Client):
+    """Discord gateway shard that scores messages for the guilds it owns
+
+    Each worker process connects as one shard of the bot, so the gateway
+    only delivers events for its own guilds. It periodically reports its
+    raw windowed scores to the aggregator through a multiprocessing queue.
+    """
+
+    def __init__(self, shard_id, shard_count, guild_ids, reports, channel_ids=None, meme_coins=None,
+                 window=60, half_life=None, report_interval=5):
+        intents = discord.Intents.default()
+        intents.message_content = True
+        super().__init__(intents=intents, shard_id=shard_id, shard_count=shard_count)
+
+        self.shard = shard_id
+        self.guild_ids = set(guild_ids)
+        self.channel_ids = set(channel_ids or [])  # Empty means every text channel of the guilds
+        self.reports = reports
+        self.report_interval = report_interval
+        self.scorer = TrendScorer(meme_coins or DEFAULT_MEME_COINS, window=window, half_life=half_life)
+
+    async def setup_hook(self):
+        self.bg_task = self.loop.create_task(self.report_scores())
+
+    async def on_ready(self):
+        if not self.channel_ids:
+            for guild_id in self.guild_ids:
+                guild = self.get_guild(guild_id)
+                if guild:
+                    self.channel_ids.update(channel.id for channel in guild.text_channels)
+        print(f"Shard {self.shard} monitoring {len(self.channel_ids)} channels in {len(self.guild_ids)} guilds")
+
+    async def on_message(self, message):
+        if message.author == self.user or message.guild is None:
+            return
+        # Set lookups keep filtering O(1) per message
+        if message.guild.id not in self.guild_ids or message.channel.id not in self.channel_ids:
+            return
+        self.scorer.ingest(message.content, time.time())
+
+    async def report_scores(self):
+        """Send this shard's raw window scores to the aggregator"""
+        await self.wait_until_ready()
+        while not self.is_closed():
+            now = time.time()
+            self.reports.put((self.shard, now, self.scorer.raw_scores(now), self.scorer.messages))
+            await asyncio.sleep(self.report_interval)
+
+
+class TrendAggregator:
+    """Merges the latest per-shard window counters into normalized 0-100 scores"""
+
+    def __init__(self, meme_coins=None, stale_after=30):
+        self.meme_coins = meme_coins or DEFAULT_MEME_COINS
+        self.stale_after = stale_after
+        self.shards = {}  # shard -> (reported at, raw scores, messages)
+
+    def report(self, shard, timestamp, raw_scores, messages=0):
+        self.shards[shard] = (timestamp, raw_scores, messages)
+
+    def raw_scores(self, now):
+        """Sum of the window counters of every shard that reported recently"""
+        merged = {}
+        for reported_at, raw_scores, _ in self.shards.values():
+            if now - reported_at > self.stale_after:
+                continue
+            for coin, score in raw_scores.items():
+                merged[coin] = merged.get(coin, 0) + score
+        return merged
+
+    def scores(self, now):
+        return normalize_scores(self.raw_scores(now), self.meme_coins)
+
+    @property
+    def messages(self):
+        return sum(messages for _, _, messages in self.shards.values())
+
+
+def run_worker(token, shard_id, shard_count, guild_ids, reports, options):
+    """Process entry point for one shard"""
+    worker = ShardWorker(shard_id, shard_count, guild_ids, reports, **options)
+    worker.run(token)
+
+
+async def publish_scores(workers, reports, aggregator, publisher, update_interval):
+    """Merge shard reports and publish the scores every update_interval while any worker runs"""
+    last_publish = time.time()
+    while any(process.is_alive() for process in workers):
+        try:
+            # The blocking queue read happens off the event loop
+            aggregator.report(*await asyncio.to_thread(reports.get, timeout=1))
+        except queue.Empty:
+            pass
+
+        now = time.time()
+        if now - last_publish >= update_interval:
+            scores = aggregator.scores(now)
+            await publisher.publish(scores)
+            last_publish = now
+            print(f"Meme trend results from {len(aggregator.shards)} shards "
+                  f"({aggregator.messages} messages): {scores}")
+
+
+def run_sharded(token, guild_ids, shard_count, channel_ids=None, update_interval=60, window=60,
+                half_life=None, meme_coins=None, publisher=None):
+    """Start one worker process per shard and publish aggregated scores every update_interval"""
+    context = multiprocessing.get_context("spawn")
+    reports = context.Queue()
+    publisher = publisher or TrendPublisher()
+    aggregator = TrendAggregator(meme_coins)
+
+    workers = []
+    for shard_id in range(shard_count):
+        owned = [guild_id for guild_id in guild_ids if shard_for_guild(guild_id, shard_count) == shard_id]
+        if not owned:
+            continue
+        options = {"channel_ids": channel_ids, "meme_coins": meme_coins, "window": window, "half_life": half_life}
+        process = context.Process(
+            target=run_worker, args=(token, shard_id, shard_count, owned, reports, options), daemon=True
+        )
+        process.start()
+        workers.append(process)
+        print(f"Started shard {shard_id} for {len(owned)} guilds")
+
+    try:
+        asyncio.run(publish_scores(workers, reports, aggregator, publisher, update_interval))
+    finally:
+        for process in workers:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded Discord meme monitor")
+    parser.add_argument("--guild", type=int, action="append", required=True, help="Guild id to monitor (repeatable)")
+    parser.add_argument("--channel", type=int, action="append", help="Only monitor these channel ids")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between published scans")
+    parser.add_argument("--window", type=float, default=60, help="Scoring window in seconds")
+    parser.add_argument("--half-life", type=float, help="Use exponential decay with this half-life in seconds")
+    parser.add_argument("--keywords", help="JSON file with the coin -> keywords table")
+    args = parser.parse_args()
+
+    meme_coins = DEFAULT_MEME_COINS
+    if args.keywords:
+        with open(args.keywords) as f:
+            meme_coins = json.load(f)
+
+    run_sharded(
+        os.environ["DISCORD_TOKEN"], args.guild, args.shards, channel_ids=args.channel,
+        update_interval=args.interval, window=args.window, half_life=args.half_life, meme_coins=meme_coins
+    )
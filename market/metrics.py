@@ -0,0 +1,167 @@
+import bisect
+import resource
+import time
+from contextlib import contextmanager
+
+# Default histogram buckets in seconds, from 100us to 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB"""
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, key, value
+
+
+class Gauge:
+    """Point-in-time value, either set directly or read from a callback when collected"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, callback=None):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.values = {}
+
+    def set(self, value, **labels):
+        self.values[_label_key(labels)] = value
+
+    def samples(self):
+        if self.callback is not None:
+            yield self.name, (), self.callback()
+        for key, value in self.values.items():
+            yield self.name, key, value
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count of observed values"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.values = {}  # label key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[index] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        for key, state in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield f"{self.name}_bucket", key + (("le", repr(float(bound))),), cumulative
+            yield f"{self.name}_bucket", key + (("le", "+Inf"),), state[-1]
+            yield f"{self.name}_sum", key, state[-2]
+            yield f"{self.name}_count", key, state[-1]
+
+    def summary(self, **labels):
+        """Count, mean and approximate percentiles (upper bucket bounds)"""
+        state = self.values.get(_label_key(labels))
+        if not state or not state[-1]:
+            return {"count": 0}
+        count = state[-1]
+        result = {"count": count, "mean": state[-2] / count}
+        for name, quantile in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            cumulative = 0
+            result[name] = None  # Above the largest bucket
+            for bound, bucket_count in zip(self.buckets, state):
+                cumulative += bucket_count
+                if cumulative >= quantile * count:
+                    result[name] = bound
+                    break
+        return result
+
+
+class MetricsRegistry:
+    """Named metrics rendered as Prometheus text or a JSON-friendly dict"""
+
+    def __init__(self, prefix="market_"):
+        self.prefix = prefix
+        self.metrics = {}
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text):
+        return self._register(Counter(self.prefix + name, help_text))
+
+    def gauge(self, name, help_text, callback=None):
+        return self._register(Gauge(self.prefix + name, help_text, callback))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self.prefix + name, help_text, buckets))
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def as_dict(self):
+        """Counters and gauges by label, histograms summarized"""
+        result = {}
+        for metric in self.metrics.values():
+            name = metric.name[len(self.prefix):]
+            if isinstance(metric, Histogram):
+                result[name] = {
+                    _format_labels(key) or "all": metric.summary(**dict(key)) for key in metric.values
+                }
+            else:
+                result[name] = {_format_labels(key) or "all": value for _, key, value in metric.samples()}
+        return result
@@ -0,0 +1,135 @@
+import csv
+import glob
+import logging
+import os
+import queue
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from history import iso_timestamp
+
+logger = logging.getLogger(__name__)
+
+HEADER = ["Asset", "Price", "Market Cap", "Volume", "Timestamp"]
+
+
+class MarketRecorder:
+    """Buffers tick snapshots in memory and appends them to CSV segments on a worker thread
+
+    record() only copies the price columns, so it is cheap enough for the
+    tick path. flush() hands the buffer to the worker thread, which appends
+    it to the current segment file and starts a new segment once it holds
+    segment_rows rows.
+    """
+
+    def __init__(self, directory="market_changes", segment_rows=500000):
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self._buffer = []
+        self._queue = queue.Queue()
+        self._writer = None
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_rows = 0
+        self.recorded_rows = 0
+
+    def open(self):
+        """Start the writer thread"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def record(self, timestamp, asset_ids, prices, market_caps, volumes):
+        """Buffer one snapshot of every asset"""
+        self._buffer.append((timestamp, asset_ids, np.array(prices), np.array(market_caps), np.array(volumes)))
+        self.recorded_rows += len(asset_ids)
+
+    def flush(self):
+        """Hand buffered snapshots to the writer thread"""
+        if self._buffer:
+            self._queue.put(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        """Write out everything buffered and stop the writer thread"""
+        self.flush()
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def _write_loop(self):
+        while True:
+            snapshots = self._queue.get()
+            if snapshots is None:
+                self._queue.task_done()
+                return
+            try:
+                with self._lock:
+                    self._write(snapshots)
+            except Exception as e:
+                logger.error(f"Error recording market changes: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, snapshots):
+        f = None
+        try:
+            for timestamp, asset_ids, prices, market_caps, volumes in snapshots:
+                if f is None or self._segment_rows >= self.segment_rows:
+                    if f is not None:
+                        f.close()
+                    if self._segment is None or self._segment_rows >= self.segment_rows:
+                        # Start a new segment named after its first snapshot
+                        self._segment = os.path.join(self.directory, f"segment-{int(timestamp * 1000)}.csv")
+                        self._segment_rows = 0
+                        with open(self._segment, "w", newline="") as header:
+                            csv.writer(header).writerow(HEADER)
+                    f = open(self._segment, "a", newline="")
+                    writer = csv.writer(f)
+
+                iso = iso_timestamp(timestamp)
+                writer.writerows(
+                    zip(asset_ids, prices.tolist(), market_caps.tolist(), volumes.tolist(), [iso] * len(asset_ids))
+                )
+                self._segment_rows += len(asset_ids)
+        finally:
+            if f is not None:
+                f.close()
+
+    def segments(self):
+        """Segment files in the order they were written"""
+        return sorted(glob.glob(os.path.join(self.directory, "segment-*.csv")))
+
+    def export_excel(self, excel_file, max_rows=1000000):
+        """Write the most recent recorded rows to an Excel file and return the row count
+
+        Excel sheets are limited to about a million rows, so only the last
+        max_rows rows are exported. Blocks until already flushed snapshots
+        are written, so call it from a worker thread.
+        """
+        self._queue.join()
+        frames = []
+        rows = 0
+        with self._lock:
+            for segment in reversed(self.segments()):
+                frame = pd.read_csv(segment)
+                frames.append(frame)
+                rows += len(frame)
+                if rows >= max_rows:
+                    break
+
+        df = pd.concat(reversed(frames), ignore_index=True).tail(max_rows) if frames else pd.DataFrame(columns=HEADER)
+        df.to_excel(excel_file, index=False, sheet_name="Market Changes")
+        return len(df)
+
+
+if __name__ == "__main__":
+    # Usage: python recorder.py [directory] [excel_file]
+    directory = sys.argv[1] if len(sys.argv) > 1 else "market_changes"
+    excel_file = sys.argv[2] if len(sys.argv) > 2 else "market_changes.xlsx"
+    rows = MarketRecorder(directory).export_excel(excel_file)
+    print(f"Exported {rows} rows to {excel_file}")
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledJob:
+    """A coroutine function run every interval seconds, with its timing statistics"""
+
+    def __init__(self, name, interval, callback):
+        self.name = name
+        self.interval = interval
+        self.callback = callback
+        self.deadline = None  # Monotonic time of the next run
+        self.task = None
+        self.runs = 0
+        self.late = 0
+        self.missed = 0
+        self.max_lateness = 0.0
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "late": self.late,
+            "missed": self.missed,
+            "max_lateness": self.max_lateness
+        }
+
+
+class Scheduler:
+    """Runs periodic jobs on monotonic-clock deadlines, each in its own task
+
+    Deadlines advance by whole intervals from the job's start rather than
+    from when the previous run finished, so a job does not drift. A run
+    that starts more than late_fraction of its interval after its deadline
+    counts as late; if whole intervals have passed, those runs are skipped
+    and counted as missed instead of being run back to back. A slow job
+    only delays itself, never the other jobs' deadlines.
+    """
+
+    def __init__(self, late_fraction=0.1, lateness_histogram=None, late_counter=None, missed_counter=None):
+        self.late_fraction = late_fraction
+        self.lateness_histogram = lateness_histogram
+        self.late_counter = late_counter
+        self.missed_counter = missed_counter
+        self.jobs = {}
+        self.running = False
+
+    def add(self, name, interval, callback):
+        """Schedule callback() every interval seconds; starts right away if the scheduler is running"""
+        if name in self.jobs:
+            raise ValueError(f"Job already scheduled: {name}")
+        job = ScheduledJob(name, interval, callback)
+        self.jobs[name] = job
+        if self.running:
+            self._start(job)
+        return job
+
+    def remove(self, name):
+        """Stop and forget a job"""
+        job = self.jobs.pop(name)
+        if job.task is not None:
+            job.task.cancel()
+
+    def stats(self):
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+    async def run(self):
+        """Run every job until cancelled"""
+        self.running = True
+        for job in self.jobs.values():
+            self._start(job)
+        try:
+            await asyncio.Future()
+        finally:
+            self.running = False
+            for job in self.jobs.values():
+                if job.task is not None:
+                    job.task.cancel()
+                    job.task = None
+
+    def _start(self, job):
+        job.deadline = time.monotonic() + job.interval
+        job.task = asyncio.create_task(self._run_job(job))
+
+    async def _run_job(self, job):
+        while True:
+            delay = job.deadline - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            lateness = time.monotonic() - job.deadline
+            if lateness >= job.interval:
+                # Skip the runs that are already overdue and realign to the schedule
+                skipped = int(lateness // job.interval)
+                job.missed += skipped
+                job.deadline += skipped * job.interval
+                lateness -= skipped * job.interval
+                if self.missed_counter is not None:
+                    self.missed_counter.inc(skipped, job=job.name)
+                logger.warning(f"Job {job.name} missed {skipped} runs")
+            if lateness > job.interval * self.late_fraction:
+                job.late += 1
+                if self.late_counter is not None:
+                    self.late_counter.inc(job=job.name)
+            job.max_lateness = max(job.max_lateness, lateness)
+            if self.lateness_histogram is not None:
+                self.lateness_histogram.observe(lateness, job=job.name)
+
+            job.runs += 1
+            try:
+                await job.callback()
+            except Exception as e:
+                logger.error(f"Error in scheduled job {job.name}: {e}")
+            job.deadline += job.interval
@@ -1,33 +1,167 @@
 import asyncio
+import hmac
 import json
 import websockets
-import random
 import time
 import os
 from datetime import datetime
 import logging
-import pandas as pd
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+from engine import MarketEngine, meme_trend_impact, validate_trend_scores
+from fanout import FanOut, COALESCE, CHANNELS, TICKS, TRADES, CANDLES, TRENDS
+from history import PriceHistory
+from candles import CandleBook
+from journal import TransactionJournal
+from recorder import MarketRecorder
+from metrics import MetricsRegistry
+from codec import JSON, epoch_timestamp, get_codec
+from snapshot import MarketSnapshotter, split_state
+from catalog import AssetCatalog, DEFAULT_CATALOG_FILE
+from market_state import MarketStateSnapshot
+from scheduler import Scheduler
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Actions tracked by name in the request metrics; anything else is counted as "unknown"
+REQUEST_ACTIONS = ("buy", "sell", "get_assets", "resync", "get_transactions", "get_candles",
+                   "push_meme_trends", "get_meme_trends", "export_excel", "get_client_stats", "get_metrics",
+                   "subscribe", "unsubscribe", "batch")
+
+# Actions allowed inside a batch: orders and read-only queries
+BATCH_ACTIONS = ("buy", "sell", "get_assets", "get_transactions", "get_candles", "get_meme_trends",
+                 "get_client_stats", "get_metrics")
+MAX_BATCH_REQUESTS = 1000
+
+# Actions that wait on worker threads or fills run concurrently with the connection's later requests
+CONCURRENT_ACTIONS = ("get_transactions", "export_excel", "batch")
+
+
+class BatchReply:
+    """Stands in for a client connection to collect the response to one request of a batch"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.future = asyncio.get_running_loop().create_future()
+
+
 class MarketServer:
-    def __init__(self, port=8765, trends_file="meme_trends.json"):
+    def __init__(self, port=8765, trends_file="meme_trends.json", max_client_queue=256, slow_client_policy=COALESCE,
+                 order_batch_size=500, order_batch_wait=0.005, seed=None,
+                 history_capacity=100, candle_capacity=200, journal_file="transactions.db",
+                 recorder_dir="market_changes", push_token=None, log_sample_every=100, asset_filter=None,
+                 snapshot_file="market_snapshot.npz", snapshot_interval=30,
+                 catalog_file=DEFAULT_CATALOG_FILE):
         self.port = port
-        self.clients = set()
-        self.assets = {}
-        self.transaction_history = []
+        # Optional predicate on asset ids; a cluster shard only loads the assets it owns
+        self.asset_filter = asset_filter
+        self.metrics = MetricsRegistry()
+        self.setup_metrics()
+        # Connected clients, each with its own bounded send queue
+        self.clients = FanOut(max_queue=max_client_queue, slow_policy=slow_client_policy,
+                              send_histogram=self.client_send_seconds)
+        # Columnar price state; the dict-shaped assets view is built on demand
+        self.engine = MarketEngine(seed=seed)
+        self.history = PriceHistory(capacity=history_capacity)
+        self.candles = CandleBook(capacity=candle_capacity)
+        # Durable record of every fill, replayed into market state on startup
+        self.journal = TransactionJournal(journal_file)
+        
+        # Orders are queued by the websocket handlers and applied in batches
+        self.order_queue = asyncio.Queue()
+        self.order_batch_size = order_batch_size
+        self.order_batch_wait = order_batch_wait  # seconds to wait for a batch to fill
+        
+        # Pipelined requests still running, held so they are not garbage collected
+        self.request_tasks = set()
+        
+        # Ticks and background jobs run on monotonic deadlines, each job in its own task
+        self.scheduler = Scheduler(lateness_histogram=self.job_lateness_seconds,
+                                   late_counter=self.jobs_late, missed_counter=self.jobs_missed)
+        self.tick_groups = {}  # tick interval -> slots stepped at that interval, None for all
         self.last_update = time.time()
-        self.update_interval = 1.0  # Update market every second
+        self.update_interval = 1.0  # Default tick interval for classes without their own
         self.trends_file = trends_file
         self.meme_trends = {}
+        self.meme_trends_timestamp = None
+        # Shared secret for the push_meme_trends action; pushing is disabled without one
+        self.push_token = push_token if push_token is not None else os.environ.get("MARKET_PUSH_TOKEN")
         self.last_trends_check = 0
         self.trends_check_interval = 10  # Check for new trends every 10 seconds
         self.excel_file = "market_changes.xlsx"
         
-    async def register(self, websocket):
-        self.clients.add(websocket)
+        # Asset classes and instruments come from the catalog file, reloaded when it changes
+        self.catalog_file = catalog_file
+        self.catalog = None
+        self.catalog_mtime = None
+        self.catalog_check_interval = 5  # Check the catalog for changes every 5 seconds
+        
+        # Tick snapshots are recorded off the event loop; Excel is export-only
+        self.recorder = MarketRecorder(recorder_dir)
+        self.recorder_flush_interval = 5  # Hand buffered ticks to the writer every 5 seconds
+        
+        # Full market state is snapshotted periodically and restored on startup;
+        # journaled fills after the snapshot's journal id are replayed on top
+        self.snapshotter = MarketSnapshotter(snapshot_file)
+        self.snapshot_interval = snapshot_interval  # seconds between snapshots
+        self.snapshot_journal_id = 0
+        
+        # Delta broadcast state: sequence number of the last update sent,
+        # and the engine columns and history counts as of that update
+        self.sequence = 0
+        self._broadcast_ids = []
+        self._broadcast_columns = {}
+        
+        # market_state and get_assets reads between broadcasts share one snapshot
+        self.state_snapshot = None
+        
+        # Per-batch and per-asset details are only logged for every Nth event, at debug level
+        self.log_sample_every = log_sample_every
+        
+    def setup_metrics(self):
+        """Register the server's hot-path counters, histograms and gauges"""
+        metrics = self.metrics
+        self.tick_seconds = metrics.histogram("tick_seconds", "Duration of a full market tick")
+        self.step_seconds = metrics.histogram("price_step_seconds", "Time spent stepping prices in update_market")
+        self.trends_check_seconds = metrics.histogram("trends_check_seconds", "Time spent in check_meme_trends")
+        self.excel_export_seconds = metrics.histogram("excel_export_seconds", "Time spent exporting market changes to Excel")
+        self.broadcast_encode_seconds = metrics.histogram("broadcast_encode_seconds", "Time to build and encode a market update")
+        self.broadcast_publish_seconds = metrics.histogram("broadcast_publish_seconds", "Time to queue a market update for every client")
+        self.client_send_seconds = metrics.histogram("client_send_seconds", "Time to write one message to a client websocket")
+        self.order_batch_seconds = metrics.histogram("order_batch_seconds", "Time to apply and acknowledge an order batch")
+        self.snapshot_capture_seconds = metrics.histogram("snapshot_capture_seconds", "Time to copy the market state for a snapshot")
+        self.state_build_seconds = metrics.histogram("state_build_seconds", "Time to build the shared market_state snapshot of a sequence")
+        self.request_seconds = metrics.histogram("request_seconds", "Client request latency by action")
+        self.job_lateness_seconds = metrics.histogram("job_lateness_seconds", "Delay of scheduled ticks and jobs past their deadline")
+        self.jobs_late = metrics.counter("jobs_late_total", "Scheduled runs that started late, by job")
+        self.jobs_missed = metrics.counter("jobs_missed_total", "Scheduled runs skipped because they were overdue, by job")
+        self.requests = metrics.counter("requests_total", "Client requests by action")
+        self.orders_matched = metrics.counter("orders_matched_total", "Orders filled by the matching task")
+        self.order_batches = metrics.counter("order_batches_total", "Order batches applied")
+        self.broadcasts = metrics.counter("broadcasts_total", "Market updates broadcast")
+        metrics.gauge("connected_clients", "Connected websocket clients", lambda: len(self.clients))
+        metrics.gauge("order_queue_depth", "Orders waiting to be matched", lambda: self.order_queue.qsize())
+        metrics.gauge("client_queue_depth", "Messages queued across all clients", lambda: self.clients.queue_depths()[0])
+        metrics.gauge("client_queue_depth_max", "Largest outbound queue of any client", lambda: self.clients.queue_depths()[1])
+        metrics.gauge("sequence", "Sequence number of the last market update", lambda: self.sequence)
+        
+    @property
+    def assets(self):
+        """Dict-shaped view of every asset, projected from the engine"""
+        return {asset_id: self.asset_view(asset_id) for asset_id in self.engine}
+        
+    def asset_view(self, asset_id, history=None):
+        """Dict-shaped view of one asset including its price history"""
+        slot = self.engine.slots[asset_id]
+        asset = self.engine.asset_dict(slot)
+        asset["history"] = self.history.points(slot) if history is None else history
+        return asset
+        
+    async def register(self, websocket, codec=None):
+        self.clients.add(websocket, codec)
         logger.info(f"Client connected. Total clients: {len(self.clients)}")
         await self.send_market_state(websocket)
         
@@ -36,78 +170,262 @@ class MarketServer:
         logger.info(f"Client disconnected. Total clients: {len(self.clients)}")
         
     async def send_market_state(self, websocket):
-        """Send current market state to a specific client"""
-        await websocket.send(json.dumps({
-            "type": "market_state",
-            "data": self.assets,
-            "timestamp": datetime.now().isoformat()
-        }))
+        """Send a full snapshot of the assets a specific client watches"""
+        connection = self.clients.connections.get(websocket)
+        if connection is not None:
+            self.clients.send(websocket, self.encode_market_state(connection.assets, connection.codec))
         
-    async def broadcast_market_update(self):
-        """Broadcast market updates to all connected clients"""
-        if not self.clients:
-            return
+    def encode_market_state(self, assets=None, codec=None):
+        """Encode a full market_state message as of the current sequence number"""
+        return self.market_snapshot().market_state(codec or get_codec(JSON), assets)
+        
+    def market_snapshot(self):
+        """Shared snapshot of every asset, built on the first read after each broadcast"""
+        if self.state_snapshot is None or self.state_snapshot.sequence != self.sequence:
+            with self.state_build_seconds.time():
+                self.state_snapshot = MarketStateSnapshot(self.sequence, self.build_snapshot())
+        return self.state_snapshot
+        
+    def build_snapshot(self):
+        """Build a full copy of the assets as of the last broadcast sequence"""
+        snapshot = {}
+        broadcast_counts = self._broadcast_columns["history_count"]
+        broadcast_generation = self._broadcast_columns["generation"]
+        for slot, asset_id in enumerate(self.engine.ids):
+            if asset_id is None:
+                continue
+            # History points not yet broadcast arrive with the next delta, which
+            # also carries the whole history of assets added since the last one
+            unchanged = slot < len(broadcast_counts) and self.engine.generation[slot] == broadcast_generation[slot]
+            until = broadcast_counts[slot] if unchanged else 0
+            snapshot[asset_id] = self.asset_view(asset_id, self.history.points(slot, until=until))
+        return snapshot
+        
+    def build_delta(self, watched=None):
+        """Collect the fields and history points changed since the last broadcast
+        
+        With a set of watched asset ids only those assets are collected;
+        None collects every asset.
+        """
+        engine = self.engine
+        base = self._broadcast_columns
+        delta = {}
+        known = len(self._broadcast_ids)
+        
+        # Slots still holding the asset they held at the last broadcast
+        stable = engine.live[:known] & (engine.generation[:known] == base["generation"])
+        
+        # Assets added since the last broadcast, in new or reused slots, are sent in full
+        added = np.flatnonzero(engine.live[:known] & ~stable).tolist()
+        added += [slot for slot in range(known, engine.size) if engine.ids[slot] is not None]
+        if watched is not None:
+            added = [slot for slot in added if engine.ids[slot] in watched]
+            watched_slots = np.zeros(known, dtype=bool)
+            watched_slots[[engine.slots[asset_id] for asset_id in watched
+                           if asset_id in engine and engine.slots[asset_id] < known]] = True
+            stable &= watched_slots
+        for slot in added:
+            delta[engine.ids[slot]] = self.asset_view(engine.ids[slot], self.history.points(slot))
+            
+        for field in ("price", "supply", "market_cap", "volume"):
+            changed = np.flatnonzero((engine.column(field)[:known] != base[field]) & stable)
+            values = engine.column(field)[changed].tolist()
+            for slot, value in zip(changed.tolist(), values):
+                delta.setdefault(engine.ids[slot], {})[field] = value
+                
+        trend_changed = ((engine.trend_impact[:known] != base["trend_impact"]) |
+                         (engine.has_trend[:known] != base["has_trend"])) & stable
+        for slot in np.flatnonzero(trend_changed).tolist():
+            delta.setdefault(engine.ids[slot], {})["modifiers"] = engine.asset_dict(slot).get("modifiers", [])
             
-        message = json.dumps({
+        broadcast_counts = base["history_count"]
+        grown = np.flatnonzero((self.history.counts[:known] > broadcast_counts) & stable)
+        for slot in grown.tolist():
+            delta.setdefault(engine.ids[slot], {})["history"] = self.history.points(slot, since=broadcast_counts[slot])
+                
+        removed = [asset_id for asset_id in self._broadcast_ids if asset_id is not None and asset_id not in engine]
+        return delta, removed
+        
+    def mark_broadcast(self):
+        """Record the current engine columns as the baseline for the next delta"""
+        engine = self.engine
+        self.state_snapshot = None
+        self._broadcast_ids = list(engine.ids)
+        self._broadcast_columns = {
+            field: engine.column(field).copy()
+            for field in ("price", "supply", "market_cap", "volume", "trend_impact")
+        }
+        self._broadcast_columns["has_trend"] = engine.has_trend.copy()
+        self._broadcast_columns["generation"] = engine.generation.copy()
+        self._broadcast_columns["history_count"] = self.history.counts[:engine.size].copy()
+        
+    async def broadcast_market_update(self):
+        """Broadcast the changes since the previous update to all connected clients"""
+        started = time.perf_counter()
+        if self.clients.groups(TICKS):
+            # Unwatched assets would be filtered out of every payload, so they are never collected
+            delta, removed = self.build_delta(self.clients.watched_assets())
+        else:
+            delta, removed = {}, []
+        self.sequence += 1
+        self.mark_broadcast()
+        self.broadcasts.inc()
+        
+        update = {
             "type": "market_update",
-            "data": self.assets,
+            "seq": self.sequence,
             "timestamp": datetime.now().isoformat()
-        })
+        }
+        if removed:
+            update["removed"] = removed
+        # Every ticks subscriber gets every sequence number, even with no changes to its assets
+        self.publish_topics(TICKS, update, delta, started=started)
         
-        await asyncio.gather(
-            *[client.send(message) for client in self.clients]
-        )
+    def publish_topics(self, channel, message, data, skip_empty=False, started=None):
+        """Send a message to a channel's subscribers with data filtered to the assets each one watches
+        
+        Each asset's entry in data is encoded once per wire format and the
+        entries are spliced into one payload per distinct set of watched
+        assets and format.
+        """
+        groups = self.clients.groups(channel)
+        if not groups:
+            return
+        started = time.perf_counter() if started is None else started
+        
+        watched = self.clients.watched_assets()
+        data = {asset_id: value for asset_id, value in data.items() if watched is None or asset_id in watched}
+        fragments = {}  # codec -> asset id -> encoded entry
+        payloads = []
+        for (assets, codec), connections in groups.items():
+            if codec not in fragments:
+                fragments[codec] = {asset_id: codec.entry(asset_id, value) for asset_id, value in data.items()}
+            if assets is None:
+                selected = list(fragments[codec].values())
+            else:
+                selected = [fragment for asset_id, fragment in fragments[codec].items() if asset_id in assets]
+            if skip_empty and not selected:
+                continue
+            payloads.append((codec.splice(message, selected), assets, codec, connections))
+        self.broadcast_encode_seconds.observe(time.perf_counter() - started, channel=channel)
+        
+        # Slow clients get coalesced to a fresh market_state of their assets
+        with self.broadcast_publish_seconds.time(channel=channel):
+            for payload, assets, codec, connections in payloads:
+                snapshot = lambda assets=assets, codec=codec: self.encode_market_state(assets, codec)
+                self.clients.publish(payload, snapshot=snapshot, connections=connections)
         
     async def handle_transaction(self, transaction):
-        """Process a buy/sell transaction and update market accordingly"""
-        asset_id = transaction["asset_id"]
-        action = transaction["action"]  # "buy" or "sell"
-        amount = transaction["amount"]
-        price = self.assets[asset_id]["price"]
-        
-        # Record transaction
-        transaction_record = {
-            "timestamp": datetime.now().isoformat(),
-            "asset_id": asset_id,
-            "action": action,
-            "amount": amount,
-            "price": price,
-            "total": amount * price
-        }
-        self.transaction_history.append(transaction_record)
-        
-        # Update asset price based on transaction
-        price_impact = (amount / self.assets[asset_id]["market_cap"]) * 100
-        if action == "buy":
-            # Buy pressure increases price
-            self.assets[asset_id]["price"] *= (1 + (price_impact * 0.01))
-            self.assets[asset_id]["volume"] += amount * price
-        else:
-            # Sell pressure decreases price
-            self.assets[asset_id]["price"] *= (1 - (price_impact * 0.01))
-            self.assets[asset_id]["volume"] += amount * price
+        """Process a single buy/sell transaction and update market accordingly"""
+        return self.apply_orders([transaction])[0]
+        
+    def apply_orders(self, orders):
+        """Apply a batch of buy/sell orders with one combined price impact per asset"""
+        if not orders:
+            return []
+            
+        now = time.time()
+        timestamp = datetime.fromtimestamp(now).isoformat()
+        slots = [self.engine.slots[order["asset_id"]] for order in orders]
+        # Buy pressure increases price, sell pressure decreases it
+        signed_amounts = [order["amount"] if order["action"] == "buy" else -order["amount"] for order in orders]
+        
+        # Every order in a batch fills at the pre-batch price
+        fill_prices, touched, traded = self.engine.apply_orders(slots, signed_amounts)
+        
+        # Record transactions in the journal
+        post_prices = self.engine.price[slots].tolist()
+        entries = [
+            (now, order["asset_id"], order["action"], order["amount"], price, order["amount"] * price, post_price)
+            for order, price, post_price in zip(orders, fill_prices.tolist(), post_prices)
+        ]
+        ids = self.journal.append(entries)
+        
+        records = []
+        for transaction_id, (_, asset_id, action, amount, price, total, _) in zip(ids, entries):
+            records.append({
+                "id": transaction_id,
+                "timestamp": timestamp,
+                "asset_id": asset_id,
+                "action": action,  # "buy" or "sell"
+                "amount": amount,
+                "price": price,
+                "total": total
+            })
             
-        # Update market cap
-        self.assets[asset_id]["market_cap"] = self.assets[asset_id]["price"] * self.assets[asset_id]["supply"]
+        # Update price history and candles
+        self.history.append_rows(touched, now, self.engine.price[touched])
+        self.candles.update_rows(touched, now, self.engine.price[touched], traded)
+            
+        return records
         
-        # Update price history
-        if "history" not in self.assets[asset_id]:
-            self.assets[asset_id]["history"] = []
+    async def match_orders(self):
+        """Drain the order queue in micro-batches, acknowledging each order"""
+        while True:
+            batch = [await self.order_queue.get()]
+            
+            # Collect more orders until the batch is full or the wait expires
+            deadline = time.monotonic() + self.order_batch_wait
+            while len(batch) < self.order_batch_size:
+                if self.order_queue.empty():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.order_queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self.order_queue.get_nowait())
+                    
+            started = time.perf_counter()
+            try:
+                # Assets may have been removed while the order was queued
+                valid = [(ws, order) for ws, order in batch if order["asset_id"] in self.engine]
+                records = self.apply_orders([order for _, order in valid])
+                
+                for (websocket, order), record in zip(valid, records):
+                    self.respond(websocket, order, {"status": "success", "data": record})
+                for websocket, order in batch:
+                    if order["asset_id"] not in self.engine:
+                        self.respond(websocket, order, {"status": "error", "message": "Asset not found"})
+                        
+                if records:
+                    # One coalesced update for the whole batch
+                    await self.broadcast_market_update()
+                    self.publish_trades(records)
+                    self.orders_matched.inc(len(records))
+                    self.order_batches.inc()
+                    batches = self.order_batches.values[()]
+                    if batches % self.log_sample_every == 0:
+                        logger.debug(f"Matched {len(records)} orders across "
+                                     f"{len({r['asset_id'] for r in records})} assets (batch {batches})")
+            except Exception as e:
+                logger.error(f"Error matching order batch: {e}")
+            self.order_batch_seconds.observe(time.perf_counter() - started)
         
-        self.assets[asset_id]["history"].append({
-            "timestamp": datetime.now().isoformat(),
-            "price": self.assets[asset_id]["price"]
-        })
+    def publish_trades(self, records):
+        """Send the fills of a batch to trades subscribers of the traded assets"""
+        trades = {}
+        for record in records:
+            trades.setdefault(record["asset_id"], []).append(record)
+        self.publish_topics(TRADES, {"type": "trades", "seq": self.sequence}, trades, skip_empty=True)
         
-        logger.info(f"Transaction processed: {action} {amount} of {asset_id} at {price}")
-        return transaction_record
+    def publish_candles(self):
+        """Send the open bars of every watched asset to candles subscribers"""
+        if not self.clients.groups(CANDLES):
+            return
+        watched = self.clients.watched_assets()
+        bars = {
+            asset_id: self.candles.open_bars(slot)
+            for asset_id, slot in self.engine.slots.items() if watched is None or asset_id in watched
+        }
+        self.publish_topics(CANDLES, {"type": "candles", "seq": self.sequence}, bars, skip_empty=True)
         
     async def check_meme_trends(self):
         """Check for updated meme trends from Discord monitoring"""
         current_time = time.time()
-        
-        if current_time - self.last_trends_check < self.trends_check_interval:
-            return
+        started = time.perf_counter()
             
         try:
             # Check if trends file exists and has been updated
@@ -116,238 +434,461 @@ class MarketServer:
                 
                 # Only read if file has been modified since last check
                 if file_modified_time > self.last_trends_check:
-                    with open(self.trends_file, 'r') as f:
-                        trend_data = json.load(f)
+                    trend_data = await asyncio.to_thread(self.read_trends_file)
                     
-                    # Update meme trends
-                    self.meme_trends = trend_data.get("scores", {})
-                    logger.info(f"Updated meme trends: {self.meme_trends}")
-                    
-                    # Update modifiers for each meme coin
-                    for asset_id, score in self.meme_trends.items():
-                        if asset_id in self.assets and self.assets[asset_id]["type"] == "meme_coin":
-                            # Convert score (0-100) to impact factor (0.9-1.1)
-                            impact = 0.9 + (score / 500)  # Score 0 -> 0.9, Score 100 -> 1.1
-                            
-                            # Update modifiers
-                            for i, modifier in enumerate(self.assets[asset_id]["modifiers"]):
-                                if modifier["type"] == "meme_trend":
-                                    self.assets[asset_id]["modifiers"][i]["impact"] = impact
-                                    break
-                            else:
-                                # Add new modifier if not found
-                                self.assets[asset_id]["modifiers"].append({
-                                    "type": "meme_trend",
-                                    "impact": impact
-                                })
-                                
-                            logger.info(f"Updated {asset_id} meme trend impact to {impact}")
+                    # Skip results that already arrived over the push channel
+                    if trend_data.get("timestamp") != self.meme_trends_timestamp:
+                        try:
+                            self.apply_meme_trends(trend_data.get("scores", {}), trend_data.get("timestamp"))
+                        except ValueError as e:
+                            logger.error(f"Ignoring trends file {self.trends_file}: {e}")
                 
                 # Update last check time
                 self.last_trends_check = current_time
                 
         except Exception as e:
             logger.error(f"Error checking meme trends: {e}")
+        self.trends_check_seconds.observe(time.perf_counter() - started)
         
-    async def update_market(self):
-        """Update market prices based on time, random factors and meme trends"""
-        current_time = time.time()
-        elapsed = current_time - self.last_update
-        
-        if elapsed < self.update_interval:
-            return
+    def read_trends_file(self):
+        with open(self.trends_file, 'r') as f:
+            return json.load(f)
             
-        # Check for meme trends updates
-        await self.check_meme_trends()
-            
-        for asset_id, asset_data in self.assets.items():
-            # Apply natural market movement
-            if asset_data["type"] == "meme_coin":
-                # Meme coins have higher volatility
-                volatility = random.uniform(0.95, 1.05)
-            elif asset_data["type"] == "stable_coin":
-                # Stable coins have very low volatility
-                volatility = random.uniform(0.998, 1.002)
-            else:  # stocks
-                # Stocks have medium volatility
-                volatility = random.uniform(0.99, 1.01)
+    def apply_meme_trends(self, scores, timestamp=None):
+        """Update meme trend scores and the trend impact of each meme coin
+        
+        Raises ValueError on a bad score or a timestamp that is not ISO 8601,
+        before anything changes.
+        """
+        validate_trend_scores(scores)
+        if timestamp is not None:
+            try:
+                epoch_timestamp(timestamp)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid meme trends timestamp: {timestamp!r}") from None
                 
-            # Apply custom asset modifiers (like meme trends)
-            if "modifiers" in asset_data:
-                for modifier in asset_data["modifiers"]:
-                    if modifier["type"] == "meme_trend":
-                        # Apply meme trend impact
-                        trend_impact = modifier["impact"]
-                        volatility *= trend_impact
-            
-            # Update price
-            self.assets[asset_id]["price"] *= volatility
-            self.assets[asset_id]["market_cap"] = self.assets[asset_id]["price"] * self.assets[asset_id]["supply"]
-            
-            # Add some random trading volume
-            self.assets[asset_id]["volume"] += random.uniform(0, self.assets[asset_id]["market_cap"] * 0.001)
-            
-            # Update price history
-            if "history" not in self.assets[asset_id]:
-                self.assets[asset_id]["history"] = []
+        # Update modifiers for each meme coin
+        for asset_id, score in scores.items():
+            if asset_id in self.engine and self.engine.info[self.engine.slots[asset_id]]["type"] == "meme_coin":
+                # Convert score (0-100) to impact factor (0.9-1.1)
+                impact = meme_trend_impact(score)
+                self.engine.set_trend_impact(asset_id, impact)
+                
+                logger.debug(f"Updated {asset_id} meme trend impact to {impact}")
+                
+        self.meme_trends = scores
+        self.meme_trends_timestamp = timestamp
+        logger.info(f"Updated meme trends: {self.meme_trends}")
+        self.publish_topics(TRENDS, {"type": "meme_trends", "timestamp": timestamp}, scores, skip_empty=True)
+        
+    async def update_market(self, slots=None):
+        """Advance prices one tick, for every asset or only the given slots, and broadcast the changes"""
+        current_time = time.time()
+        tick_started = time.perf_counter()
+        rows = np.arange(self.engine.size) if slots is None else slots
             
-            self.assets[asset_id]["history"].append({
-                "timestamp": datetime.now().isoformat(),
-                "price": self.assets[asset_id]["price"]
-            })
+        with self.step_seconds.time():
+            # Advance the assets in one vectorized step
+            traded = self.engine.step(slots)
             
-            # Limit history size to prevent memory issues
-            if len(self.assets[asset_id]["history"]) > 100:
-                self.assets[asset_id]["history"] = self.assets[asset_id]["history"][-100:]
+            # Update price history and candles; the ring buffers bound their size
+            self.history.append_rows(rows, current_time, self.engine.price[rows])
+            self.candles.update_rows(rows, current_time, self.engine.price[rows], traded)
         
         self.last_update = current_time
         await self.broadcast_market_update()
+        self.publish_candles()
+        
+        # Buffer the tick for the background recorder
+        live = rows[self.engine.live[rows]]
+        self.recorder.record(current_time, [self.engine.ids[slot] for slot in live.tolist()], self.engine.price[live],
+                             self.engine.market_cap[live], self.engine.volume[live])
+        self.tick_seconds.observe(time.perf_counter() - tick_started)
+        
+    def schedule_ticks(self):
+        """Group assets by the tick interval of their class and keep one tick job per interval"""
+        groups = {}
+        for slot in self.engine.slots.values():
+            asset_type = self.engine.info[slot]["type"]
+            interval = self.catalog.tick_interval(asset_type, self.update_interval) if self.catalog else self.update_interval
+            groups.setdefault(interval, []).append(slot)
+        if len(groups) <= 1:
+            # One rate for the whole market steps every slot at once
+            self.tick_groups = {next(iter(groups), self.update_interval): None}
+        else:
+            self.tick_groups = {interval: np.array(sorted(slots), dtype=np.intp) for interval, slots in groups.items()}
+            
+        for name, job in list(self.scheduler.jobs.items()):
+            if name.startswith("tick_") and job.interval not in self.tick_groups:
+                self.scheduler.remove(name)
+        for interval in self.tick_groups:
+            name = f"tick_{interval:g}s"
+            if name not in self.scheduler.jobs:
+                self.scheduler.add(name, interval, lambda interval=interval: self.update_market(self.tick_groups[interval]))
+                
+    def schedule_jobs(self):
+        """Schedule price ticks and the background jobs that must not delay them"""
+        self.schedule_ticks()
+        self.scheduler.add("trends", self.trends_check_interval, self.check_meme_trends)
+        self.scheduler.add("catalog", self.catalog_check_interval, self.load_catalog)
+        self.scheduler.add("recorder_flush", self.recorder_flush_interval, self.flush_recorder)
+        self.scheduler.add("snapshot", self.snapshot_interval, self.save_snapshot)
+        
+    async def flush_recorder(self):
+        self.recorder.flush()
+        
+    async def save_snapshot(self):
+        with self.snapshot_capture_seconds.time():
+            self.snapshotter.save(self.capture_state())
         
-        # Save market changes to Excel
-        self.save_market_changes_to_excel()
+    async def save_market_changes_to_excel(self):
+        """Export the recorded market changes to an Excel file on demand"""
+        with self.excel_export_seconds.time():
+            self.recorder.flush()
+            rows = await asyncio.to_thread(self.recorder.export_excel, self.excel_file)
+        logger.info(f"Saved {rows} market changes to {self.excel_file}")
+        return rows
         
-    def save_market_changes_to_excel(self):
-        """Save market changes to an Excel file"""
+    async def handle_message(self, websocket, message):
+        """Handle an incoming client message; slow actions run without blocking the next one"""
+        started = time.perf_counter()
+        connection = self.clients.connections.get(websocket)
         try:
-            # Create a DataFrame from the assets
-            data = []
-            for asset_id, asset_data in self.assets.items():
-                data.append({
-                    "Asset": asset_id,
-                    "Price": asset_data["price"],
-                    "Market Cap": asset_data["market_cap"],
-                    "Volume": asset_data["volume"],
-                    "Timestamp": datetime.now().isoformat()
-                })
+            data = connection.codec.decode(message) if connection is not None else json.loads(message)
+        except Exception:
+            data = None
+        if not isinstance(data, dict):
+            self.respond(websocket, {}, {"status": "error", "message": "Invalid message"})
+            return
             
-            df = pd.DataFrame(data)
+        if data.get("action") in CONCURRENT_ACTIONS:
+            # Responses carry the request id, so they may overtake each other
+            task = asyncio.create_task(self.run_request(websocket, data, started))
+            self.request_tasks.add(task)
+            task.add_done_callback(self.request_tasks.discard)
+        else:
+            await self.run_request(websocket, data, started)
             
-            # Append to Excel file
-            if os.path.exists(self.excel_file):
-                with pd.ExcelWriter(self.excel_file, mode='a', if_sheet_exists='replace') as writer:
-                    df.to_excel(writer, index=False, sheet_name="Market Changes")
-            else:
-                df.to_excel(self.excel_file, index=False, sheet_name="Market Changes")
-                
-            logger.info(f"Saved market changes to {self.excel_file}")
+    async def run_request(self, websocket, data, started):
+        """Dispatch a decoded request, recording its latency by action"""
+        action = data.get("action")
+        action = action if action in REQUEST_ACTIONS else "unknown"
+        try:
+            await self.dispatch_message(websocket, data)
         except Exception as e:
-            logger.error(f"Error saving market changes to Excel: {e}")
+            logger.error(f"Error handling {action} request: {e}")
+            self.respond(websocket, data, {"status": "error", "message": f"Invalid {action} request"})
+        finally:
+            self.requests.inc(action=action)
+            self.request_seconds.observe(time.perf_counter() - started, action=action)
         
-    async def handle_message(self, websocket, message):
-        """Handle incoming client messages"""
-        data = json.loads(message)
+    async def dispatch_message(self, websocket, data):
+        """Run the action requested by a decoded client message"""
         response = {"status": "error", "message": "Unknown command"}
         
         if data.get("action") == "buy" or data.get("action") == "sell":
-            if data["asset_id"] in self.assets:
-                transaction = await self.handle_transaction({
+            if data["asset_id"] in self.engine:
+                # The matching task acknowledges the order once it is filled
+                await self.order_queue.put((websocket, {
                     "asset_id": data["asset_id"],
                     "action": data["action"],
-                    "amount": float(data["amount"])
-                })
-                response = {"status": "success", "data": transaction}
-                # Broadcast update to all clients after a transaction
-                await self.broadcast_market_update()
+                    "amount": float(data["amount"]),
+                    "id": data.get("id")
+                }))
+                return
             else:
                 response = {"status": "error", "message": "Asset not found"}
         
+        elif data.get("action") == "batch":
+            response = await self.run_batch(websocket, data.get("requests"))
+            
         elif data.get("action") == "get_assets":
-            response = {"status": "success", "data": self.assets}
+            # Served from the snapshot of the last broadcast, encoded once per wire format
+            snapshot = self.market_snapshot()
+            if not isinstance(websocket, BatchReply):
+                self.respond_encoded(websocket, data, {"status": "success"}, snapshot)
+                return
+            response = {"status": "success", "data": snapshot.data}
+            
+        elif data.get("action") == "resync":
+            # Client detected a sequence gap and needs a fresh snapshot
+            await self.send_market_state(websocket)
+            return
             
         elif data.get("action") == "get_transactions":
-            response = {"status": "success", "data": self.transaction_history}
+            # Journal queries run in a worker thread off the event loop
+            transactions, next_cursor = await asyncio.to_thread(
+                self.journal.query,
+                asset_id=data.get("asset_id"),
+                start=data.get("start"),
+                end=data.get("end"),
+                cursor=data.get("cursor"),
+                limit=data.get("limit", 100),
+                descending=bool(data.get("descending", False))
+            )
+            response = {"status": "success", "data": transactions, "next_cursor": next_cursor}
+            
+        elif data.get("action") == "get_candles":
+            if data.get("asset_id") in self.engine:
+                try:
+                    response = {"status": "success", "data": self.candles.query(
+                        self.engine.slots[data["asset_id"]],
+                        data.get("resolution", "1m"),
+                        start=data.get("start"),
+                        end=data.get("end"),
+                        limit=data.get("limit", 300)
+                    )}
+                except ValueError as e:
+                    response = {"status": "error", "message": str(e)}
+            else:
+                response = {"status": "error", "message": "Asset not found"}
+            
+        elif data.get("action") == "push_meme_trends":
+            # Trend scores pushed by the meme monitor as soon as a scan completes
+            if not self.push_token or not hmac.compare_digest(str(data.get("token", "")), self.push_token):
+                response = {"status": "error", "message": "Unauthorized"}
+            elif not isinstance(data.get("scores"), dict):
+                response = {"status": "error", "message": "Missing scores"}
+            else:
+                try:
+                    self.apply_meme_trends(data["scores"], data.get("timestamp"))
+                    response = {"status": "success"}
+                except ValueError as e:
+                    response = {"status": "error", "message": str(e)}
             
         elif data.get("action") == "get_meme_trends":
             response = {"status": "success", "data": self.meme_trends}
+            
+        elif data.get("action") == "export_excel":
+            try:
+                rows = await self.save_market_changes_to_excel()
+                response = {"status": "success", "data": {"file": self.excel_file, "rows": rows}}
+            except Exception as e:
+                logger.error(f"Error saving market changes to Excel: {e}")
+                response = {"status": "error", "message": str(e)}
+            
+        elif data.get("action") == "get_client_stats":
+            response = {"status": "success", "data": self.clients.stats()}
+            
+        elif data.get("action") == "get_metrics":
+            if data.get("format") == "prometheus":
+                response = {"status": "success", "data": self.metrics.render()}
+            else:
+                response = {"status": "success", "data": self.metrics.as_dict()}
+                
+        elif data.get("action") in ("subscribe", "unsubscribe"):
+            assets = data.get("assets")
+            channels = data.get("channels") or []
+            unknown = [channel for channel in channels if channel not in CHANNELS]
+            if unknown:
+                response = {"status": "error", "message": f"Unknown channel: {unknown[0]}"}
+            elif assets is not None and assets != "*" and not isinstance(assets, list):
+                response = {"status": "error", "message": "assets must be a list of asset ids or \"*\""}
+            else:
+                if data["action"] == "subscribe":
+                    connection = self.clients.subscribe(websocket, assets, channels)
+                else:
+                    connection = self.clients.unsubscribe(websocket, assets, channels, list(self.engine))
+                response = {"status": "success", "data": {
+                    "assets": sorted(connection.assets) if connection.assets is not None else "*",
+                    "channels": sorted(connection.channels)
+                }}
+                if data["action"] == "subscribe" and (assets or TICKS in channels):
+                    # Newly watched assets need a full state before their deltas apply
+                    self.respond(websocket, data, response)
+                    await self.send_market_state(websocket)
+                    return
+        
+        self.respond(websocket, data, response)
+        
+    def respond(self, websocket, request, response):
+        """Send a response, echoing the request id so clients can match it up"""
+        response["type"] = "response"
+        if request.get("id") is not None:
+            response["id"] = request["id"]
+        if isinstance(websocket, BatchReply):
+            if not websocket.future.done():
+                websocket.future.set_result(response)
+            return
+        self.clients.send_message(websocket, response)
+        
+    def respond_encoded(self, websocket, request, response, snapshot):
+        """Send a response whose data is a state snapshot's assets, spliced from their encoded entries"""
+        connection = self.clients.connections.get(websocket)
+        if connection is None:
+            return
+        response["type"] = "response"
+        if request.get("id") is not None:
+            response["id"] = request["id"]
+        self.clients.send(websocket, snapshot.encode(response, connection.codec))
+        
+    async def run_batch(self, websocket, requests):
+        """Run a list of orders and queries, answering with their responses in request order"""
+        if not isinstance(requests, list):
+            return {"status": "error", "message": "requests must be a list"}
+        if len(requests) > MAX_BATCH_REQUESTS:
+            return {"status": "error", "message": f"A batch holds at most {MAX_BATCH_REQUESTS} requests"}
+            
+        replies = []
+        for request in requests:
+            reply = BatchReply(websocket)
+            if not isinstance(request, dict) or request.get("action") not in BATCH_ACTIONS:
+                self.respond(reply, request if isinstance(request, dict) else {},
+                             {"status": "error", "message": "Action not allowed in a batch"})
+            else:
+                # Orders in a batch enter the order queue together and may fill in one matching batch
+                await self.run_request(reply, request, time.perf_counter())
+            replies.append(reply.future)
+        return {"status": "success", "data": list(await asyncio.gather(*replies))}
+
+    async def load_catalog(self):
+        """Apply the catalog file to the running market if it changed since it was last loaded"""
+        try:
+            modified = os.path.getmtime(self.catalog_file)
+        except OSError:
+            if self.catalog_mtime is None:
+                logger.warning(f"Asset catalog {self.catalog_file} not found")
+                self.catalog_mtime = 0
+            return False
+        if modified == self.catalog_mtime:
+            return False
+            
+        # Parsing a large catalog happens off the event loop
+        self.catalog_mtime = modified
+        try:
+            catalog = await asyncio.to_thread(AssetCatalog.load, self.catalog_file)
+        except Exception as e:
+            logger.error(f"Error loading asset catalog {self.catalog_file}: {e}")
+            return False
+        try:
+            self.apply_catalog(catalog)
+        except Exception as e:
+            logger.error(f"Error applying asset catalog {self.catalog_file}: {e}")
+            return False
+        return True
+        
+    def apply_catalog(self, catalog):
+        """Add, remove and update assets so the market matches a catalog"""
+        engine = self.engine
+        if self.catalog is None:
+            added = [asset_id for asset_id in catalog if asset_id not in engine]
+            removed = [asset_id for asset_id in engine if asset_id not in catalog]
+            changed = [asset_id for asset_id in catalog if asset_id in engine]
+        else:
+            added, removed, changed = catalog.diff(self.catalog)
+            added = [asset_id for asset_id in added if asset_id not in engine]
+            removed = [asset_id for asset_id in removed if asset_id in engine]
+            changed = [asset_id for asset_id in changed if asset_id in engine]
+        if self.asset_filter is not None:
+            added = [asset_id for asset_id in added if self.asset_filter(asset_id)]
+            
+        for asset_id in removed:
+            engine.remove_asset(asset_id)
+            
+        # New assets start their history at the last tick, ahead of the next one
+        for asset_id in added:
+            asset_data = catalog.asset_data(asset_id)
+            slot = engine.add_asset(asset_id, asset_data, catalog.band(asset_data["type"]))
+            self.reset_slot(slot)
+            self.history.append(slot, self.last_update, asset_data["price"])
+            
+        for asset_id in changed:
+            asset_data = catalog.asset_data(asset_id)
+            engine.update_asset(asset_id, asset_data, catalog.band(asset_data["type"]))
+            
+        self.catalog = catalog
+        self.schedule_ticks()
+        logger.info(f"Applied asset catalog: {len(added)} added, {len(removed)} removed, "
+                    f"{len(changed)} updated, {len(engine)} assets")
         
-        await websocket.send(json.dumps(response))
+    def reset_slot(self, slot):
+        """Clear the history and candle rows of a new asset's slot, which may be reused from a removed asset"""
+        self.history.ensure_rows(slot + 1)
+        self.candles.ensure_rows(slot + 1)
+        self.history.reset(slot)
+        self.candles.reset(slot)
 
-    async def load_initial_assets(self):
-        """Load initial assets into the market"""
-        self.assets = {
-            "DOGE": {
-                "type": "meme_coin",
-                "name": "Dogecoin",
-                "symbol": "DOGE",
-                "price": 0.12,
-                "supply": 150000000000,
-                "market_cap": 18000000000,
-                "volume": 1000000,
-                "history": [],
-                "modifiers": [
-                    {"type": "meme_trend", "impact": 1.0}
-                ]
-            },
-            "PEPE": {
-                "type": "meme_coin",
-                "name": "Pepe Coin",
-                "symbol": "PEPE",
-                "price": 0.000001,
-                "supply": 42000000000000,
-                "market_cap": 42000000,
-                "volume": 500000,
-                "history": [],
-                "modifiers": [
-                    {"type": "meme_trend", "impact": 1.0}
-                ]
-            },
-            "SHIB": {
-                "type": "meme_coin",
-                "name": "Shiba Inu",
-                "symbol": "SHIB",
-                "price": 0.000015,
-                "supply": 589000000000000,
-                "market_cap": 8835000000,
-                "volume": 750000,
-                "history": [],
-                "modifiers": [
-                    {"type": "meme_trend", "impact": 1.0}
-                ]
-            },
-            "USDT": {
-                "type": "stable_coin",
-                "name": "Tether",
-                "symbol": "USDT",
-                "price": 1.0,
-                "supply": 100000000000,
-                "market_cap": 100000000000,
-                "volume": 50000000000,
-                "history": []
-            },
-            "AAPL": {
-                "type": "stock",
-                "name": "Apple Inc.",
-                "symbol": "AAPL",
-                "price": 185.92,
-                "supply": 15000000000,
-                "market_cap": 2788800000000,
-                "volume": 10000000000,
-                "history": []
-            },
-            "MSFT": {
-                "type": "stock",
-                "name": "Microsoft Corporation",
-                "symbol": "MSFT",
-                "price": 403.78,
-                "supply": 7420000000,
-                "market_cap": 2996047600000,
-                "volume": 8000000000,
-                "history": []
-            }
+    def capture_state(self):
+        """Copy everything needed to restart the market into a flat state dict"""
+        rows = self.engine.size
+        state = {
+            "sequence": self.sequence,
+            "journal_id": self.journal.next_id - 1,
+            "journal_file": os.path.abspath(self.journal.path),
+            "meme_trends": self.meme_trends,
+            "meme_trends_timestamp": self.meme_trends_timestamp,
+            "created": time.time()
         }
+        for prefix, component in (("engine", self.engine.state()), ("history", self.history.state(rows)),
+                                  ("candles", self.candles.state(rows))):
+            state.update({f"{prefix}.{key}": value for key, value in component.items()})
+        return state
+        
+    def restore_snapshot(self):
+        """Restore the market from the latest snapshot; returns False if there is none"""
+        started = time.perf_counter()
+        try:
+            state = self.snapshotter.load()
+        except Exception as e:
+            logger.error(f"Error loading market snapshot {self.snapshotter.path}: {e}")
+            return False
+        if state is None:
+            return False
+        # The journal id only means something for the journal the snapshot was taken with
+        if state.get("journal_file") != os.path.abspath(self.journal.path):
+            logger.warning(f"Ignoring snapshot {self.snapshotter.path} taken with journal {state.get('journal_file')}")
+            return False
+            
+        self.engine.load_state(split_state(state, "engine"))
+        self.history.load_state(split_state(state, "history"))
+        self.history.ensure_rows(self.engine.size)
+        self.candles.ensure_rows(self.engine.size)
+        self.candles.load_state(split_state(state, "candles"))
+        self.sequence = state["sequence"]
+        self.snapshot_journal_id = state["journal_id"]
+        self.meme_trends = state["meme_trends"]
+        self.meme_trends_timestamp = state["meme_trends_timestamp"]
+        self.mark_broadcast()
+        logger.info(f"Restored {len(self.engine)} assets at seq {self.sequence} from {self.snapshotter.path} "
+                    f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return True
         
-        # Initialize history for each asset
-        for asset_id in self.assets:
-            self.assets[asset_id]["history"] = [{
-                "timestamp": datetime.now().isoformat(),
-                "price": self.assets[asset_id]["price"]
-            }]
+    async def recover_from_journal(self, after_id=0):
+        """Replay journaled fills after an id into the freshly loaded market state"""
+        totals = await asyncio.to_thread(self.journal.asset_totals, after_id)
+        recovered = 0
+        for asset_id, (post_price, timestamp, volume) in totals.items():
+            if asset_id not in self.engine:
+                continue
+            slot = self.engine.slots[asset_id]
+            self.engine.price[slot] = post_price
+            self.engine.market_cap[slot] = post_price * self.engine.supply[slot]
+            self.engine.volume[slot] += volume
+            self.history.append(slot, timestamp, post_price)
+            recovered += 1
             
-        logger.info("Initial assets loaded")
+        if recovered:
+            self.mark_broadcast()
+            logger.info(f"Recovered {recovered} assets from {self.journal.next_id - 1 - after_id} journaled transactions")
+        
+    @staticmethod
+    def requested_format(path):
+        """Wire format asked for in the connection URL, e.g. ws://host:8765/?format=msgpack"""
+        return parse_qs(urlparse(path).query).get("format", [JSON])[0]
+        
+    def process_request(self, connection, request):
+        """Serve GET /metrics over plain HTTP and reject unsupported wire formats"""
+        if request.path == "/metrics":
+            return connection.respond(HTTPStatus.OK, self.metrics.render())
+        try:
+            get_codec(self.requested_format(request.path))
+        except ValueError as e:
+            return connection.respond(HTTPStatus.BAD_REQUEST, f"{e}\n")
+        return None
         
     async def handler(self, websocket, path=None):
         """Main handler for WebSocket connections"""
-        await self.register(websocket)
+        await self.register(websocket, get_codec(self.requested_format(websocket.request.path)))
         try:
             async for message in websocket:
                 await self.handle_message(websocket, message)
@@ -358,20 +899,42 @@ class MarketServer:
             
     async def run(self):
         """Start the market server"""
-        await self.load_initial_assets()
+        # Restore the last snapshot, then bring the market in line with the catalog
+        self.restore_snapshot()
+        await self.load_catalog()
+        if self.catalog is None:
+            raise RuntimeError(f"Could not load the asset catalog {self.catalog_file}")
+        self.mark_broadcast()
+        self.journal.open()
+        await self.recover_from_journal(self.snapshot_journal_id)
+        self.recorder.open()
+        self.snapshotter.open()
         
         # Start the WebSocket server
         server = await websockets.serve(
             lambda ws, path=None: self.handler(ws, path), 
             "localhost", 
-            self.port
+            self.port,
+            process_request=self.process_request
         )
         logger.info(f"Market server started on port {self.port}")
         
-        # Keep the server running
-        while True:
-            await self.update_market()
-            await asyncio.sleep(0.1)  # Small sleep to prevent CPU hogging
+        # Start the order matching task
+        matcher = asyncio.create_task(self.match_orders())
+        
+        # Run the price ticks and background jobs until shut down
+        await self.check_meme_trends()
+        self.schedule_jobs()
+        try:
+            await self.scheduler.run()
+        finally:
+            # Snapshot the final state and flush queued writes on shutdown
+            server.close()
+            matcher.cancel()
+            self.snapshotter.save(self.capture_state())
+            self.snapshotter.close()
+            self.journal.close()
+            self.recorder.close()
 
 if __name__ == "__main__":
     # Run the server in the main thread
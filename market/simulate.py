@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+from catalog import AssetCatalog, DEFAULT_CATALOG_FILE
+from engine import MarketEngine, meme_trend_impact, validate_trend_scores
+from metrics import peak_rss_mb
+
+
+def load_script(path, asset_ids=None):
+    """Read a JSONL script of {"time", "type": "order" | "meme_trends", ...} events
+
+    Orders must name one of asset_ids, when given, and trend scores must
+    be numbers from 0 to 100, as the server requires.
+    """
+    events = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event.get("type") not in ("order", "meme_trends") or "time" not in event:
+                raise ValueError(f"{path}:{number}: an event needs a time and a type of order or meme_trends")
+            if event["type"] == "order":
+                if asset_ids is not None and event.get("asset_id") not in asset_ids:
+                    raise ValueError(f"{path}:{number}: unknown asset {event.get('asset_id')!r}")
+                if event.get("action") not in ("buy", "sell") or not isinstance(event.get("amount"), (int, float)):
+                    raise ValueError(f"{path}:{number}: an order needs an action of buy or sell and an amount")
+            else:
+                if not isinstance(event.get("scores"), dict):
+                    raise ValueError(f"{path}:{number}: a meme_trends event needs a map of scores")
+                try:
+                    validate_trend_scores(event["scores"])
+                except ValueError as e:
+                    raise ValueError(f"{path}:{number}: {e}") from None
+            events.append(event)
+    # Events at the same time keep their order in the script
+    events.sort(key=lambda event: event["time"])
+    return events
+
+
+class MarketSimulation:
+    """Headless market driven by a virtual clock and a script of orders and trends
+
+    Prices move through the same MarketEngine as the live server, seeded
+    so a run is reproducible bit for bit. Tick k happens at
+    start + k * tick_interval seconds of virtual time; the ticks between
+    two scripted events are stepped in vectorized blocks, so a run goes
+    as fast as NumPy allows. Orders with the same time form one batch and
+    fill at the pre-batch price, as in the server's matching task; an
+    event applies after every tick at or before its time.
+    """
+
+    def __init__(self, catalog, seed=0, tick_interval=1.0, start=0.0, block_size=4096, record_every=1):
+        self.engine = MarketEngine(seed=seed)
+        for asset_id in catalog:
+            asset_data = catalog.asset_data(asset_id)
+            self.engine.add_asset(asset_id, asset_data, catalog.band(asset_data["type"]))
+        self.asset_ids = list(self.engine.ids)
+        self.tick_interval = tick_interval
+        self.start = start
+        self.block_size = block_size
+        self.record_every = record_every
+        self.tick = 0
+
+        self.prices = []  # (ticks, assets) blocks of recorded prices
+        self.times = []
+        self.trades = []  # (time, slot, signed amount, fill price) per filled order
+
+    def ticks_until(self, timestamp):
+        """Number of ticks at or before a virtual time"""
+        return max(0, math.floor((timestamp - self.start) / self.tick_interval))
+
+    def run(self, ticks, events=()):
+        """Run the script's events and ticks up to the given tick count, then return the report"""
+        started = time.perf_counter()
+        events = list(events)
+        index = 0
+        while index < len(events):
+            due = self.ticks_until(events[index]["time"])
+            if due > ticks:
+                break
+            if self.tick < due:
+                self.advance(due - self.tick)
+
+            # Orders with equal times are matched as one batch
+            batch = [events[index]]
+            index += 1
+            while (index < len(events) and batch[0]["type"] == "order" and events[index]["type"] == "order"
+                   and events[index]["time"] == batch[0]["time"]):
+                batch.append(events[index])
+                index += 1
+            if batch[0]["type"] == "order":
+                self.apply_orders(batch)
+            else:
+                self.apply_meme_trends(batch[0]["scores"])
+        if self.tick < ticks:
+            self.advance(ticks - self.tick)
+        return self.report(time.perf_counter() - started)
+
+    def advance(self, ticks):
+        """Step ticks in blocks, recording every record_every-th price"""
+        while ticks > 0:
+            block = min(ticks, self.block_size)
+            prices, _ = self.engine.step_many(block)
+            numbers = np.arange(self.tick + 1, self.tick + block + 1)
+            recorded = numbers % self.record_every == 0
+            if recorded.any():
+                self.prices.append(prices[recorded])
+                self.times.append(self.start + numbers[recorded] * self.tick_interval)
+            self.tick += block
+            ticks -= block
+
+    def apply_orders(self, orders):
+        slots = [self.engine.slots[order["asset_id"]] for order in orders]
+        signed_amounts = [order["amount"] if order["action"] == "buy" else -order["amount"] for order in orders]
+        fill_prices, _, _ = self.engine.apply_orders(slots, signed_amounts)
+        for slot, amount, price in zip(slots, signed_amounts, fill_prices.tolist()):
+            self.trades.append((orders[0]["time"], slot, amount, price))
+
+    def apply_meme_trends(self, scores):
+        for asset_id, score in scores.items():
+            if asset_id in self.engine and self.engine.info[self.engine.slots[asset_id]]["type"] == "meme_coin":
+                self.engine.set_trend_impact(asset_id, meme_trend_impact(score))
+
+    def price_series(self):
+        """Recorded tick times and prices, shaped (recorded ticks,) and (recorded ticks, assets)"""
+        if not self.prices:
+            return np.empty(0), np.empty((0, len(self.asset_ids)))
+        return np.concatenate(self.times), np.concatenate(self.prices)
+
+    def save(self, path):
+        """Write the price and trade series to an .npz file"""
+        times, prices = self.price_series()
+        trades = np.array(self.trades, dtype=np.float64).reshape(-1, 4)
+        np.savez(
+            path,
+            asset_ids=np.array(self.asset_ids),
+            times=times,
+            prices=prices,
+            trade_times=trades[:, 0],
+            trade_assets=trades[:, 1].astype(np.intp),
+            trade_amounts=trades[:, 2],
+            trade_prices=trades[:, 3]
+        )
+
+    def report(self, elapsed):
+        _, prices = self.price_series()
+        return {
+            "ticks": self.tick,
+            "assets": len(self.asset_ids),
+            "trades": len(self.trades),
+            "virtual_seconds": self.tick * self.tick_interval,
+            "elapsed_seconds": elapsed,
+            "ticks_per_second": self.tick / elapsed if elapsed > 0 else 0,
+            # Two runs with the same seed, catalog and script give the same digest
+            "price_digest": hashlib.sha256(prices.tobytes()).hexdigest()[:16],
+            "peak_rss_mb": peak_rss_mb(),
+            "final_prices": dict(zip(self.asset_ids, self.engine.price.tolist()))
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the market headless in virtual time for backtests")
+    parser.add_argument("--ticks", type=int, default=86400, help="Number of ticks to simulate")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_FILE, help="Asset catalog file")
+    parser.add_argument("--script", help="JSONL file of scripted order and meme_trends events")
+    parser.add_argument("--seed", type=int, default=0, help="Price path seed")
+    parser.add_argument("--interval", type=float, default=1.0, help="Virtual seconds per tick")
+    parser.add_argument("--block", type=int, default=4096, help="Ticks stepped per vectorized block")
+    parser.add_argument("--record-every", type=int, default=1, help="Record the prices of every Nth tick")
+    parser.add_argument("--output", help="Write the price and trade series to this .npz file")
+    args = parser.parse_args()
+
+    simulation = MarketSimulation(AssetCatalog.load(args.catalog), seed=args.seed, tick_interval=args.interval,
+                                  block_size=args.block, record_every=args.record_every)
+    events = load_script(args.script, simulation.asset_ids) if args.script else []
+    report = simulation.run(args.ticks, events)
+    if args.output:
+        simulation.save(args.output)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
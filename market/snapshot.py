@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout of the snapshot file changes
+SNAPSHOT_VERSION = 2
+
+
+class RingUpdate:
+    """Entries written to a ring buffer since the previous snapshot
+
+    A snapshot holds a RingUpdate instead of a copy of a large ring, and
+    the writer applies it to a ring file kept next to the snapshot. The
+    file stores each entry with the write count it was stored at, in an
+    extra last field, so a reader can tell which entries are current.
+    """
+
+    def __init__(self, rows, capacity, row_index, counts, values):
+        self.rows = rows
+        self.capacity = capacity
+        self.row_index = row_index
+        self.counts = counts
+        self.values = values
+
+    @property
+    def nbytes(self):
+        return self.row_index.nbytes + self.counts.nbytes + self.values.nbytes
+
+
+def ring_path(path, key):
+    """File holding the ring stored under key for the snapshot at path"""
+    return f"{os.path.splitext(path)[0]}.{key}.npy"
+
+
+def open_ring(path, shape):
+    """Memory-map a ring file, creating it or growing its rows to fit shape"""
+    ring = np.lib.format.open_memmap(path, mode="r+") if os.path.exists(path) else None
+    if ring is not None and ring.shape[1:] == shape[1:] and len(ring) >= shape[0]:
+        return ring
+
+    # Build the new file beside the old one so a crash never leaves a torn ring
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".ring-", suffix=".npy")
+    os.close(fd)
+    try:
+        grown = np.lib.format.open_memmap(temp_path, mode="w+", shape=shape)
+        grown[..., -1] = -1  # No entry stored yet
+        if ring is not None and ring.shape[1:] == shape[1:]:
+            grown[:len(ring)] = ring
+        grown.flush()
+        del grown
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return np.lib.format.open_memmap(path, mode="r+")
+
+
+def write_rings(path, state):
+    """Apply the state's ring updates to their files; returns the keys of the rings"""
+    keys = []
+    for key, update in state.items():
+        if not isinstance(update, RingUpdate):
+            continue
+        file_path = ring_path(path, key)
+        try:
+            ring = open_ring(file_path, (update.rows, update.capacity, update.values.shape[1] + 1))
+            positions = update.counts % update.capacity
+            ring[update.row_index, positions, :-1] = update.values
+            ring[update.row_index, positions, -1] = update.counts
+            ring.flush()
+        except BaseException:
+            # Entries of this update are lost; a fresh file marks them missing instead of stale
+            if os.path.exists(file_path):
+                os.unlink(file_path)
+            raise
+        keys.append(key)
+    return keys
+
+
+def write_snapshot(path, state):
+    """Atomically write a state dict to an .npz file
+
+    NumPy arrays are stored as arrays; ring updates are applied to their
+    ring files first, and every other value goes into one JSON document,
+    so loading never needs pickle.
+    """
+    rings = write_rings(path, state)
+    arrays = {key: value for key, value in state.items() if isinstance(value, np.ndarray)}
+    meta = {key: value for key, value in state.items() if not isinstance(value, (np.ndarray, RingUpdate))}
+    meta["version"] = SNAPSHOT_VERSION
+    meta["rings"] = rings
+    arrays["meta"] = np.array(json.dumps(meta))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-", suffix=".npz")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def read_snapshot(path):
+    """Load a state dict written by write_snapshot, or None if there is no usable snapshot"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        if meta.get("version") != SNAPSHOT_VERSION:
+            logger.warning(f"Ignoring snapshot {path} with version {meta.get('version')}")
+            return None
+        state = {key: data[key] for key in data.files if key != "meta"}
+    # Rings are mapped rather than read, so restoring one does not hold a second copy in memory
+    for key in meta.pop("rings"):
+        if os.path.exists(ring_path(path, key)):
+            state[key] = np.load(ring_path(path, key), mmap_mode="r")
+    state.update(meta)
+    return state
+
+
+def split_state(state, prefix):
+    """Entries of a flat state dict under "prefix.", with the prefix removed"""
+    prefix += "."
+    return {key[len(prefix):]: value for key, value in state.items() if key.startswith(prefix)}
+
+
+class MarketSnapshotter:
+    """Writes market snapshots on a background thread
+
+    save() takes a state dict of already copied arrays, so the caller only
+    pays for the copies; serialization and the fsync happen on the worker
+    thread. If snapshots arrive faster than they can be written, only the
+    newest one is written, after the ring updates of the skipped ones.
+    """
+
+    def __init__(self, path="market_snapshot.npz"):
+        self.path = path
+        self._queue = queue.Queue()
+        self._writer = None
+        self.saved = 0
+        self.last_duration = 0.0
+
+    def open(self):
+        """Start the writer thread"""
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def save(self, state):
+        """Queue a state dict for writing"""
+        self._queue.put(state)
+
+    def close(self):
+        """Write any queued snapshot and stop the writer thread"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def _write_loop(self):
+        while True:
+            states = [self._queue.get()]
+            while not self._queue.empty():
+                states.append(self._queue.get_nowait())
+            stop = None in states
+            states = [state for state in states if state is not None]
+            if states:
+                started = time.perf_counter()
+                try:
+                    # Skip to the newest queued snapshot; ring updates only hold new entries, so none is skipped
+                    for state in states[:-1]:
+                        write_rings(self.path, state)
+                    write_snapshot(self.path, states[-1])
+                    self.saved += 1
+                    self.last_duration = time.perf_counter() - started
+                except Exception as e:
+                    logger.error(f"Error writing market snapshot: {e}")
+            if stop:
+                return
+
+    def load(self):
+        return read_snapshot(self.path)
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import websockets
+
+PUSH_ACTION = "push_meme_trends"
+
+
+def write_trends_file(path, scores, timestamp=None):
+    """Atomically replace the trends file so readers never see a torn write"""
+    data = {
+        "timestamp": timestamp or time.strftime("%Y-%m-%d %H:%M:%S"),
+        "scores": scores
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".meme_trends-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+    return data
+
+
+class TrendPublisher:
+    """Delivers meme trend scores to the market server as soon as a scan completes
+
+    Scores are pushed over an authenticated websocket action. The trends
+    file is still written (atomically) so the server can fall back to
+    polling it when the push fails or is disabled.
+    """
+
+    def __init__(self, uri="ws://localhost:8765", token=None, results_file="meme_trends.json", timeout=5):
+        self.uri = uri
+        self.token = token if token is not None else os.environ.get("MARKET_PUSH_TOKEN")
+        self.results_file = results_file
+        self.timeout = timeout
+
+    async def publish(self, scores):
+        """Write the fallback file, then push the scores; returns True if the push was acknowledged"""
+        data = write_trends_file(self.results_file, scores)
+        if not self.token:
+            return False
+
+        try:
+            return await asyncio.wait_for(self._push(data), self.timeout)
+        except Exception as e:
+            print(f"Error pushing trend results to {self.uri}: {e}")
+            return False
+
+    async def _push(self, data):
+        async with websockets.connect(self.uri, ping_interval=None) as websocket:
+            await websocket.send(json.dumps(dict(data, action=PUSH_ACTION, token=self.token)))
+            # Skip market broadcasts until the server answers the push
+            async for message in websocket:
+                response = json.loads(message)
+                if "status" in response:
+                    if response["status"] != "success":
+                        print(f"Trend push rejected: {response.get('message')}")
+                    return response["status"] == "success"
+        return False
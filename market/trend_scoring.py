@@ -0,0 +1,113 @@
+import math
+from collections import Counter, deque
+
+from keyword_matcher import KeywordMatcher
+
+# Score given to tracked coins that were not mentioned in the window
+BASELINE_SCORE = 50
+
+# Tracked meme coins and the keywords that count as a mention
+DEFAULT_MEME_COINS = {
+    "DOGE": ["doge", "dogecoin", "moon", "shiba", "dog"],
+    "PEPE": ["pepe", "frog", "rare pepe", "kek"],
+    "SHIB": ["shiba", "shib", "shibainu", "doge killer"],
+}
+
+
+def normalize_scores(raw_scores, coins, baseline=BASELINE_SCORE):
+    """Scale raw scores to 0-100 relative to the top coin; unmentioned coins get the baseline"""
+    normalized_scores = {}
+    if raw_scores:
+        max_score = max(raw_scores.values())
+        if max_score > 0:
+            for coin, score in raw_scores.items():
+                normalized_scores[coin] = (score / max_score) * 100
+        else:
+            normalized_scores = {coin: baseline for coin in raw_scores}
+
+    for coin in coins:
+        if coin not in normalized_scores:
+            normalized_scores[coin] = baseline
+    return normalized_scores
+
+
+class TrendWindow:
+    """Per-coin score counters over a sliding time window, kept in fixed-width buckets
+
+    Points are added once per message to the bucket for its timestamp and
+    running totals are kept per coin; buckets that fall out of the window
+    are subtracted as they expire, so reading the scores costs
+    O(expired buckets) rather than O(messages). With a half_life the
+    scores decay exponentially instead of dropping out of a hard window.
+    """
+
+    def __init__(self, window=60, bucket_seconds=1.0, half_life=None):
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.half_life = half_life
+        self._buckets = deque()   # (bucket start, Counter of points per coin)
+        self._totals = Counter()
+        self._decayed = {}        # coin -> (score, as of timestamp)
+
+    def add(self, points, timestamp):
+        """Add one message's points per coin"""
+        if not points:
+            return
+        start = math.floor(timestamp / self.bucket_seconds) * self.bucket_seconds
+        if not self._buckets or self._buckets[-1][0] != start:
+            self._buckets.append((start, Counter()))
+        bucket = self._buckets[-1][1]
+        for coin, value in points.items():
+            bucket[coin] += value
+            self._totals[coin] += value
+            if self.half_life:
+                score, as_of = self._decayed.get(coin, (0.0, timestamp))
+                self._decayed[coin] = (self._decay(score, timestamp - as_of) + value, timestamp)
+
+    def _decay(self, score, elapsed):
+        return score * 0.5 ** (max(elapsed, 0) / self.half_life)
+
+    def expire(self, now):
+        """Drop buckets that ended before the start of the window"""
+        cutoff = now - self.window
+        while self._buckets and self._buckets[0][0] + self.bucket_seconds <= cutoff:
+            _, bucket = self._buckets.popleft()
+            self._totals.subtract(bucket)
+        for coin in [coin for coin, value in self._totals.items() if value <= 0]:
+            del self._totals[coin]
+
+    def scores(self, now):
+        """Raw per-coin scores as of now"""
+        self.expire(now)
+        if self.half_life:
+            return {coin: self._decay(score, now - as_of) for coin, (score, as_of) in self._decayed.items()}
+        return dict(self._totals)
+
+
+class TrendScorer:
+    """Keyword matching plus windowed scoring for a table of tracked coins"""
+
+    def __init__(self, meme_coins, window=60, bucket_seconds=1.0, half_life=None, word_boundary=False):
+        self.meme_coins = meme_coins
+        self.matcher = KeywordMatcher(meme_coins, word_boundary=word_boundary)
+        self.window = TrendWindow(window, bucket_seconds, half_life)
+        self.messages = 0
+
+    def ingest(self, content, timestamp):
+        """Score a message once and add its points to the window"""
+        self.messages += 1
+        points = self.matcher.score(content)
+        self.window.add(points, timestamp)
+        return points
+
+    def set_coins(self, meme_coins):
+        """Replace the tracked coin table; the matcher is rebuilt only if it changed"""
+        self.meme_coins = meme_coins
+        self.matcher.update(meme_coins)
+
+    def raw_scores(self, now):
+        return self.window.scores(now)
+
+    def scan(self, now):
+        """Normalized 0-100 scores for every tracked coin as of now"""
+        return normalize_scores(self.raw_scores(now), self.meme_coins)